@@ -0,0 +1,218 @@
+# Veggie Saga             #
+# Benchmarks              #
+
+# Never touches pygame or tkinter. #
+
+""" Seeded timings of the game engine and the Genetic Algorithm, written out as
+    JSON so that runs before and after a change can be compared:
+
+        python veggiebench.py --seed 0 --output before.json
+
+    Every board, fill list and move list is generated from the seed, so two runs
+    with the same seed time exactly the same work. The engine is also timed on
+    square boards of each of --board-sizes, to show how it scales with the number
+    of spaces. """
+
+import argparse, contextlib, io, json, platform, random, sys, time, timeit
+import veggieengine, veggiega
+from veggieengine import *
+from veggiega import *
+
+''' Constants '''
+
+BOARD_COUNT      = 200            # Fixed boards each micro-benchmark goes through.
+GAME_COUNT       = 50             # Headless games played for the games per second.
+POOL_SIZES       = (8, 32, 128)   # Gene pool sizes the GA is timed at.
+GA_GENERATIONS   = 50             # Generations the GA runs at each pool size.
+REPEAT           = 5              # Micro-benchmarks report the best of this many runs.
+BOARD_SIZES      = (8, 16, 32, 64) # Square board sizes the engine is timed at.
+SIZE_BOARD_COUNT = 20             # Fixed boards each board size's micro-benchmarks go through.
+SIZE_GAME_COUNT  = 3              # Repaired games played at each board size.
+
+''' Benchmarks '''
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Veggie Saga engine and GA.")
+    parser.add_argument('--seed', type=int, default=0, help="seed for every board, fill list and move list")
+    parser.add_argument('--output', default='-', help="JSON file to write, or - for stdout")
+    parser.add_argument('--games', type=int, default=GAME_COUNT, help="headless games to play")
+    parser.add_argument('--pool-sizes', default=','.join(str(size) for size in POOL_SIZES),
+                        help="comma-separated gene pool sizes to time the GA at")
+    parser.add_argument('--generations', type=int, default=GA_GENERATIONS, help="GA generations per pool size")
+    parser.add_argument('--workers', type=int, default=1, help="processes that score genomes; 1 plays in this process")
+    parser.add_argument('--board-sizes', default=','.join(str(size) for size in BOARD_SIZES),
+                        help="comma-separated square board sizes to time the engine at")
+    args = parser.parse_args()
+
+    results = runBenchmarks(args.seed, args.games, [int(size) for size in args.pool_sizes.split(',')],
+                            args.generations, args.workers, [int(size) for size in args.board_sizes.split(',')])
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+# Returns a dict of every benchmark's results.
+def runBenchmarks(seed, games=GAME_COUNT, poolSizes=POOL_SIZES, generations=GA_GENERATIONS, workers=1, boardSizes=BOARD_SIZES):
+    results = {'seed': seed,
+               'python': platform.python_version(),
+               'numpy': None if numpy is None else numpy.__version__,
+               'boardBackend': BOARD_BACKEND}
+    # The generators print what they are doing; keep it out of the JSON.
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['micro'] = benchmarkHelpers(random.Random(seed))
+        results['games'] = benchmarkGames(random.Random(seed), games)
+        results['ga']    = [benchmarkGA(random.Random(seed), poolSize, generations, workers) for poolSize in poolSizes]
+        results['boardSizes'] = [benchmarkBoardSize(random.Random(seed), size) for size in boardSizes]
+    return results
+
+# Returns the microseconds per call of the board helpers and crossover().
+def benchmarkHelpers(rng):
+    boards  = [generateInitialLayout(rng) for i in range(BOARD_COUNT)]
+    settled = [board for board in boards if findMatchingVeggiesReference(board) == []]
+    fills   = generateReplacementList(rng)
+
+    # Boards with holes where their matches, or a few random veggies, were taken out.
+    holed = []
+    for board in boards:
+        board = [column[:] for column in board]
+        removeSets = findMatchingVeggiesReference(board) or [[(rng.randrange(len(board)), rng.randrange(len(board[0])))
+                                                              for i in range(3)]]
+        for removeSet in removeSets:
+            for x, y in removeSet:
+                board[x][y] = EMPTY_SPACE
+        holed.append(board)
+
+    micro = {'findMatchingVeggies': {}, 'canMakeMove': {}}
+    for backend in (BITBOARD_BACKEND, LINES_BACKEND, REFERENCE_BACKEND):
+        micro['findMatchingVeggies'][backend] = timeBackend(backend, findMatchingVeggies, boards)
+        micro['canMakeMove'][backend]         = timeBackend(backend, canMakeMove, settled)
+    micro['getDropSlots'] = timeCalls(lambda: [getDropSlots(board, fills, 0) for board in holed], len(holed))
+
+    gene_pool = [Genome(generateMoves(rng)) for i in range(GENE_POOL_SIZE)]
+    micro['crossover'] = timeCalls(lambda: crossover(gene_pool, 0, 1, rng), 1)
+    return micro
+
+# Times function over boards with BOARD_BACKEND set to backend.
+def timeBackend(backend, function, boards):
+    saved = veggieengine.BOARD_BACKEND
+    veggieengine.BOARD_BACKEND = backend
+    try:
+        return timeCalls(lambda: [function(board) for board in boards], len(boards))
+    finally:
+        veggieengine.BOARD_BACKEND = saved
+
+# Returns the best microseconds per call over REPEAT runs of calls, which makes count calls.
+def timeCalls(calls, count):
+    timer = timeit.Timer(calls)
+    number, elapsed = timer.autorange()
+    best = min([elapsed] + timer.repeat(REPEAT - 1, number))
+    return round(best / (number * count) * 1e6, 3)
+
+# Returns the headless games per second, one game at a time and, with numpy, in a batch.
+# simulateBatch() plays fewer than BATCH_MIN_GAMES games one at a time, so the batch
+# is made up to that many games with more move lists.
+def benchmarkGames(rng, games):
+    board     = generateInitialLayout(rng)
+    fills     = generateReplacementList(rng)
+    movesList = [generateMoves(rng) for i in range(games)]
+
+    start = time.perf_counter()
+    results = [simulate(moves, board, fills) for moves in movesList]
+    elapsed = time.perf_counter() - start
+    timing = {'games': games,
+              'moves': sum(turns for score, turns in results),
+              'seconds': round(elapsed, 4),
+              'gamesPerSecond': round(games / elapsed, 2)}
+    if numpy is not None:
+        batchList = movesList + [generateMoves(rng) for i in range(games, BATCH_MIN_GAMES)]
+        start = time.perf_counter()
+        simulateBatch(batchList, board, fills)
+        elapsed = time.perf_counter() - start
+        timing['batchMinGames'] = BATCH_MIN_GAMES
+        timing['batchGames']    = len(batchList)
+        timing['batchSeconds']  = round(elapsed, 4)
+        timing['batchGamesPerSecond'] = round(len(batchList) / elapsed, 2)
+    return timing
+
+# Returns the generations per second of one GA run at poolSize, not counting the
+# scoring of the first pool, which is timed on its own.
+def benchmarkGA(rng, poolSize, generations, workers):
+    envir = Environment(generateInitialLayout(rng), generateReplacementList(rng))
+    envir.workers = workers
+    monitor = TimingMonitor()
+    savedLimit = veggiega.GENERATION_LIMIT
+    veggiega.GENERATION_LIMIT = generations
+    try:
+        start = time.perf_counter()
+        runGeneticAlgorithm(envir, poolSize, True, monitor, rng)
+        end = time.perf_counter()
+    finally:
+        veggiega.GENERATION_LIMIT = savedLimit
+        envir.close()
+    firstGeneration = monitor.firstGeneration or end
+    return {'poolSize': poolSize,
+            'generations': generations,
+            'poolSeconds': round(firstGeneration - start, 4),
+            'seconds': round(end - firstGeneration, 4),
+            'generationsPerSecond': round(generations / (end - firstGeneration), 2) if end > firstGeneration else None,
+            'fitnessCacheHits': envir.fitness_cache.hits,
+            'fitnessCacheMisses': envir.fitness_cache.misses}
+
+# Returns the microseconds per call, and the nanoseconds per space, of finding the
+# matches, the legal moves and whether there are any on size x size boards, and of
+# refilling them once their matches are taken out, with the moves per second of a few
+# repaired games. The times per space should stay about the same as the size grows.
+def benchmarkBoardSize(rng, size):
+    savedSize = (veggieengine.BOARD_WIDTH, veggieengine.BOARD_HEIGHT)
+    setBoardSize(size, size)
+    try:
+        boards = [generateInitialLayout(rng) for i in range(SIZE_BOARD_COUNT)]
+        fills  = generateReplacementList(rng)
+        holed  = []
+        for board in boards:
+            state = GameState(board)
+            for removeSet in findMatchingVeggiesReference(board):
+                for x, y in removeSet:
+                    state.setVeggie(x * size + y, EMPTY_SPACE)
+            holed.append(state.snapshot())
+        bitboards = [getBitboards(board)[:NUM_VEGGIES] for board in boards]
+        state = GameState()
+
+        timing = {'size': size, 'spaces': size * size}
+        timing['findMatchingVeggies'] = timeCalls(lambda: [findMatchingVeggies(board) for board in boards], len(boards))
+        timing['canMakeMove']         = timeCalls(lambda: [canMakeMove(board) for board in boards], len(boards))
+        timing['legalMoves']          = timeCalls(lambda: [[getSwapBitboards(bitboard) for bitboard in veggies]
+                                                           for veggies in bitboards], len(bitboards))
+        timing['refill']              = timeCalls(lambda: [refill(state, packedBoard, fills) for packedBoard in holed],
+                                                  len(holed))
+        for name in ('findMatchingVeggies', 'canMakeMove', 'legalMoves', 'refill'):
+            timing[name + 'PerSpaceNs'] = round(timing[name] * 1000 / (size * size), 3)
+
+        movesList = [generateMoves(rng) for i in range(SIZE_GAME_COUNT)]
+        start = time.perf_counter()
+        moves = sum(simulate(moves, boards[0], fills, repair=True)[1] for moves in movesList)
+        elapsed = time.perf_counter() - start
+        timing['movesPerSecond'] = round(moves / elapsed, 1)
+        return timing
+    finally:
+        setBoardSize(*savedSize)
+
+# Puts a board packed by GameState.snapshot() in state and fills its empty spaces.
+def refill(state, packedBoard, fills):
+    state.restore(packedBoard)
+    state.fill([], fills, 0)
+
+# Notes when the GA starts its first generation, once the first pool is scored.
+class TimingMonitor(Monitor):
+    def __init__(self):
+        self.firstGeneration = None
+
+    def setGeneration(self, generation):
+        if generation == 1 and self.firstGeneration is None:
+            self.firstGeneration = time.perf_counter()
+
+
+if __name__ == '__main__':
+    main()
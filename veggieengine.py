@@ -0,0 +1,1312 @@
+# Veggie Saga             #
+# Game engine             #
+
+# Pure game logic; never touches pygame or tkinter. #
+
+""" The headless simulation engine. simulate() plays a full game from a list of
+    AI moves and returns (score, turns). A renderer can watch a game by passing an
+    observer, which receives the events listed below as they happen. """
+
+import multiprocessing, re, time
+from array import array
+
+try:
+    import numpy # Optional; speeds up match detection on large boards.
+except ImportError:
+    numpy = None
+
+''' Constants '''
+
+DEBUG = False
+
+NUM_VEGGIES      = 7     # Number of veggie types.
+MAX_GAME_LENGTH  = 1000  # The number of moves until a game times out.
+
+assert NUM_VEGGIES >= 5 # The game needs at least 5 veggies
+
+BOARD_WIDTH   = 8   # Number of columns. Change the board size with setBoardSize().
+BOARD_HEIGHT  = 8   # Number of rows.
+MAX_BOARD_SIZE = 128 # The most columns or rows a board can have, so that a move fits in two bytes.
+
+SNAPSHOT_INTERVAL = 50 # The number of moves between the snapshots simulate() takes of a game.
+NUMPY_MIN_CELLS   = 256 # Boards with at least this many spaces are searched for matches with numpy.
+BATCH_MIN_GAMES   = 256 # Batches of at least this many games are played in lockstep with numpy.
+
+# Board backends for findMatchingVeggies() and canMakeMove(). They all give the same
+# results, so any of them can be selected with BOARD_BACKEND to check the others.
+REFERENCE_BACKEND = 'reference' # The original space-by-space scans.
+LINES_BACKEND     = 'lines'     # Shifted comparisons of the columns and rows; canMakeMove() scans.
+BITBOARD_BACKEND  = 'bitboard'  # Shifts and ANDs of one bit mask per veggie type.
+BOARD_BACKEND     = BITBOARD_BACKEND
+
+# Identifier constants
+UP          = 'up'
+DOWN        = 'down'
+LEFT        = 'left'
+RIGHT       = 'right'
+EMPTY_SPACE = -1       # An arbitrary, non-positive value that signifies an empty space on the board.
+HIDDEN_ROW  = 'hidden' # Signifies the invisible row above the board.
+DIRECTIONS  = (UP, DOWN, LEFT, RIGHT)
+
+# Patterns that find the spaces starting 3 identical veggies in a column or a row of a
+# board packed by packLines(), without consuming them so overlapping runs are all found.
+# LINE_STEP and HORIZONTAL_TRIPLE depend on the board size; see setBoardSize().
+LINE_END          = [EMPTY_SPACE]    # Packed after each column.
+VERTICAL_TRIPLE   = re.compile(b'(?=([^\\x00])\\1\\1)')
+
+# Simulation events passed to an observer.
+EVENT_MOVE      = 'move'      # (EVENT_MOVE, turn) before move number turn is played.
+EVENT_SWAP      = 'swap'      # (EVENT_SWAP, boardCopy, [firstVeggie, secondVeggie])
+EVENT_SWAP_BACK = 'swapBack'  # (EVENT_SWAP_BACK, boardCopy, [firstVeggie, secondVeggie])
+EVENT_DROP      = 'drop'      # (EVENT_DROP, boardCopy, movingVeggies, points, score)
+EVENT_TURN      = 'turn'      # (EVENT_TURN, boardCopy, score, turn) after a move has settled.
+
+# The phases of a move that a GameProfile times.
+PROFILE_PHASES = ('swap', 'match', 'cascade', 'canMakeMove', 'render')
+
+
+''' Simulation '''
+
+# Requires moves, an array of MAX_GAME_LENGTH size that contains the AIs moves, in order,
+# each packed into one byte by encodeMove().
+# board, the layout of the board
+# fills, the stack of items that will fill in empty spaces.
+# observer, an optional callable that receives each event. If it returns True the game stops.
+# start, an optional snapshot to resume the game from instead of playing it from the first move.
+# snapshots, an optional list that a snapshot is added to every SNAPSHOT_INTERVAL moves.
+# profile, an optional GameProfile that the time spent in each phase of the game is added to.
+# repair, if True, replaces each move that would make no match, in moves itself, with the
+# matching move nearest to it (see repairMove()), so every move of the game scores.
+def simulate(moves, board, fills, observer=None, start=None, snapshots=None, profile=None, repair=False):
+    # Plays through a single game. When the game is over, this function returns (score, turns).
+    if profile is None:
+        state = GameState()
+    else:
+        state = ProfiledGameState(profile)
+        profile.games += 1
+        if observer is not None:
+            observer = profile.timeObserver(observer)
+    if start is None:
+        score      = 0
+        turn       = 0
+        fillIndex  = 0
+        state.setBoard(board)
+
+        # Populate the initial veggies.
+        fillIndex = state.fill([], fills, fillIndex, score, observer)
+    else:
+        turn, score, fillIndex, packedBoard = start
+        state.restore(packedBoard)
+    gameIsOver = False
+
+    # Run game until there are no more possible moves, MAX_GAME_LENGTH moves have been made or the fills run out.
+    while turn < MAX_GAME_LENGTH and not gameIsOver:
+        if snapshots is not None and turn % SNAPSHOT_INTERVAL == 0:
+            snapshots.append((turn, score, fillIndex, state.snapshot()))
+        if observer is not None and observer((EVENT_MOVE, turn)):
+            break
+        state.commit()
+
+        # Get the spaces of the veggies to swap from the moves list.
+        move = moves[turn]
+        if repair:
+            move = state.repairMove(move)
+            moves[turn] = move
+        turn += 1
+        firstSpace, secondSpace, swapIndex, horizontal = MOVE_SWAPS[move]
+        if secondSpace is None:
+            raise IndexError('list index out of range') # The move swaps with a space past the board.
+
+        boardCopy = None
+        if observer is not None:
+            gameBoard = state.getBoard()
+            swappingVeggies = list(getSwappingVeggies_AI(gameBoard, DECODED_MOVES[move]))
+            boardCopy = getBoardCopyMinusVeggies(gameBoard, swappingVeggies)
+            observer((EVENT_SWAP, boardCopy, swappingVeggies))
+
+        # Swap the veggies on the board if this is a matching move.
+        matchedVeggies = state.trySwap(firstSpace, secondSpace, swapIndex, horizontal)
+        if matchedVeggies == []:
+            # Was not a matching move; the veggies swap back
+            if observer is not None:
+                observer((EVENT_SWAP_BACK, boardCopy, swappingVeggies))
+        else:
+            # This was a matching move.
+            scoreAdd = 0
+            while matchedVeggies != []:
+                # Remove matched veggies, then pull down the board.
+
+                # points is a list of dicts that tells the observer where on
+                # the board to display text to show how many points the
+                # player got. Coordinates are board spaces, not pixels.
+                points = []
+                for veggieSet in matchedVeggies:
+                    scoreAdd += (10 + (len(veggieSet) - 3) * 10)
+                    for veggie in veggieSet:
+                        state.setVeggie(veggie[0] * BOARD_HEIGHT + veggie[1], EMPTY_SPACE)
+                    points.append({'points': scoreAdd,
+                                   'x': veggie[0],
+                                   'y': veggie[1]})
+                score += scoreAdd
+
+                # Drop the new veggies.
+                try:
+                    fillIndex = state.fill(points, fills, fillIndex, score, observer)
+                except IndexError:
+                    gameIsOver = True # The fills ran out, which ends the game.
+                    break
+
+                # Check if there are any new matches.
+                matchedVeggies = state.findMatches()
+
+        if not gameIsOver and not state.canMakeMove():
+            gameIsOver = True
+
+        if observer is not None:
+            observer((EVENT_TURN, state.getBoard(), score, turn))
+
+    return score, turn
+
+# Drops veggies into every empty space, one row at a time, taking new veggies
+# from fills starting at fillIndex. Returns the updated fillIndex.
+def fillBoard(board, points, fills, fillIndex, score=0, observer=None):
+    if DEBUG: print("fillBoard")
+    dropSlots, fillIndex = getDropSlots(board, fills, fillIndex)
+    while dropSlots != [[]] * BOARD_WIDTH:
+        # keep dropping as long as there are more veggies to drop
+        movingVeggies = getDroppingVeggies(board)
+        for x in range(len(dropSlots)):
+            if len(dropSlots[x]) != 0:
+                # cause the lowest veggie in each slot to begin moving in the DOWN direction
+                movingVeggies.append({'imageNum': dropSlots[x][0], 'x': x, 'y': HIDDEN_ROW, 'direction': DOWN})
+
+        if observer is not None:
+            boardCopy = getBoardCopyMinusVeggies(board, movingVeggies)
+            observer((EVENT_DROP, boardCopy, movingVeggies, points, score))
+        moveVeggies(board, movingVeggies)
+
+        # Make the next row of veggies from the drop slots
+        # the lowest by deleting the previous lowest veggies.
+        for x in range(len(dropSlots)):
+            if len(dropSlots[x]) == 0:
+                continue
+            board[x][0] = dropSlots[x][0]
+            del dropSlots[x][0]
+    return fillIndex
+
+# A snapshot is (turn, score, fillIndex, packedBoard): everything simulate() needs to
+# carry on with a game from move number turn. Boards are packed one byte per space.
+def packBoard(board):
+    return bytes([veggie + 1 for column in board for veggie in column])
+
+# A move is packed into one number: x in the low MOVE_BITS bits, y in the next
+# MOVE_BITS and the index of its direction in DIRECTIONS in the top 2. On boards up
+# to 8 spaces across that is one byte, and moves are kept in an array('B'); on
+# larger boards it is two, in an array('H'). MOVE_TYPECODE is the one to use.
+def encodeMove(x, y, direction):
+    return x | (y << MOVE_BITS) | (DIRECTIONS.index(direction) << (2 * MOVE_BITS))
+
+def decodeMove(code):
+    mask = (1 << MOVE_BITS) - 1
+    return [code & mask, (code >> MOVE_BITS) & mask, DIRECTIONS[code >> (2 * MOVE_BITS)]]
+
+# Returns the bits each coordinate of a move takes on a width x height board.
+def getMoveBits(width, height):
+    return max(3, (max(width, height) - 1).bit_length())
+
+# Returns the array typecode of the moves of a width x height board.
+def getMoveTypecode(width, height):
+    return 'B' if getMoveBits(width, height) == 3 else 'H'
+
+# Returns an array of length moves, all 0.
+def newMoves(length):
+    return array(MOVE_TYPECODE, [0]) * length
+
+# Returns (firstSpace, secondSpace, swapIndex, horizontal) for a packed move: the flat
+# indices of the two spaces it swaps, the index of the bit of the left or upper one in
+# the swap bitboards of a GameState, and whether they are side by side. A space off
+# the left or top edge wraps around, as list indices do; secondSpace is None past the
+# other edges, or if the move starts off the board, and swapIndex is None if the
+# spaces aren't neighbours.
+def getMoveSwap(code):
+    x, y, direction = decodeMove(code)
+    x2 = x + {LEFT: -1, RIGHT: 1}.get(direction, 0)
+    y2 = y + {UP: -1, DOWN: 1}.get(direction, 0)
+    if max(x, x2) >= BOARD_WIDTH or max(y, y2) >= BOARD_HEIGHT:
+        return x * BOARD_HEIGHT + y, None, None, False
+    swapIndex = None
+    if x2 >= 0 and y2 >= 0:
+        swapIndex = min(x, x2) * BOARD_HEIGHT + min(y, y2)
+    return x * BOARD_HEIGHT + y, (x2 % BOARD_WIDTH) * BOARD_HEIGHT + y2 % BOARD_HEIGHT, swapIndex, y2 == y
+
+# Returns move if it swaps two neighbouring veggies into a triplet on a board whose
+# matching swaps are (rightSwaps, downSwaps), as GameState.getMatchingSwaps() returns
+# them. Otherwise returns the matching move whose first space is nearest to move's,
+# or move itself if no move matches.
+def repairMove(move, rightSwaps, downSwaps):
+    firstSpace, secondSpace, swapIndex, horizontal = MOVE_SWAPS[move]
+    if swapIndex is not None and (rightSwaps if horizontal else downSwaps) >> swapIndex & 1:
+        return move
+    x, y = divmod(firstSpace, BOARD_HEIGHT)
+    bestDistance = None
+    for swaps, direction in ((rightSwaps, RIGHT), (downSwaps, DOWN)):
+        bits = getSetBits(swaps)
+        i = bits.find('1')
+        while i != -1:
+            x2, y2 = divmod(i, BOARD_HEIGHT)
+            distance = abs(x2 - x) + abs(y2 - y)
+            if bestDistance is None or distance < bestDistance:
+                bestDistance = distance
+                move = encodeMove(x2, y2, direction)
+            i = bits.find('1', i + 1)
+    return move
+
+
+''' Parallel evaluation '''
+
+# Scores many games at once on a pool of worker processes. Every game is played
+# on the same board and fills, so they are sent to each worker once, when the
+# pool starts, and only the moves travel with each game.
+class FitnessPool(object):
+    def __init__(self, board, fills, workers=None, profiling=False, repairing=False):
+        # workers is the number of processes; None uses one per CPU core and
+        # 1 plays every game in this process. With profiling, resume() returns
+        # a GameProfile of each game. With repairing, resume() plays games with
+        # simulate()'s repair and returns their repaired moves.
+        self.board     = board
+        self.fills     = fills
+        self.profiling = profiling
+        self.repairing = repairing
+        self.pool      = None
+        if workers != 1:
+            self.pool = multiprocessing.Pool(workers, initWorker, (board, fills, profiling, repairing))
+
+    # Plays each (moves, start) game in tasks from its start snapshot, or from the
+    # first move if start is None. Returns a list of (score, turns, snapshots, profile,
+    # moves), where profile is None unless the pool is profiling and moves, the bytes
+    # of the repaired moves, is None unless it is repairing.
+    def resume(self, tasks):
+        if self.pool is None:
+            if useBatch(len(tasks)) and not self.profiling and not self.repairing:
+                return resumeBatch(tasks, self.board, self.fills)
+            return [resumeGame(task, self.board, self.fills, self.profiling, self.repairing) for task in tasks]
+        return self.pool.map(resumeInWorker, tasks, 1)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+workerBoard     = None
+workerFills     = None
+workerProfiling = False
+workerRepairing = False
+
+def initWorker(board, fills, profiling=False, repairing=False):
+    global workerBoard, workerFills, workerProfiling, workerRepairing
+    setBoardSize(len(board), len(board[0])) # In case the worker didn't start as a copy of this process.
+    workerBoard     = board
+    workerFills     = fills
+    workerProfiling = profiling
+    workerRepairing = repairing
+
+def resumeInWorker(task):
+    return resumeGame(task, workerBoard, workerFills, workerProfiling, workerRepairing)
+
+def resumeGame(task, board, fills, profiling=False, repairing=False):
+    moves, start = task
+    snapshots = []
+    profile   = GameProfile() if profiling else None
+    score, turns = simulate(moves, board, fills, None, start, snapshots, profile, repairing)
+    return score, turns, snapshots, profile, moves.tobytes() if repairing else None
+
+
+''' Batched simulation '''
+
+# Plays many games on the same board and fills in lockstep, with numpy: every
+# step plays the next move of each game still going as a few array operations
+# across a (games, BOARD_WIDTH, BOARD_HEIGHT) array of boards, and games drop out
+# through a mask when they end. The results are the same as simulate()'s.
+# starts is an optional list with a snapshot, or None, for each game, and
+# snapshots an optional list with a list for each game, as for simulate(). Needs numpy.
+# Returns a list of (score, turns), in the same order as movesList.
+def simulateBatch(movesList, board, fills, starts=None, snapshots=None):
+    gameCount = len(movesList)
+    if gameCount == 0:
+        return []
+    if starts is None:
+        starts = [None] * gameCount
+    if None in starts:
+        state = GameState(board)
+        fillIndex = state.fill([], fills, 0)
+        firstStart = (0, 0, fillIndex, state.snapshot())
+        starts = [firstStart if start is None else start for start in starts]
+
+    moves       = numpy.array([numpy.frombuffer(bytes(moves), MOVE_TYPECODE) for moves in movesList])
+    turns       = numpy.array([start[0] for start in starts], numpy.int64)
+    scores      = numpy.array([start[1] for start in starts], numpy.int64)
+    fillIndexes = numpy.array([start[2] for start in starts], numpy.int64)
+    boards      = numpy.array([numpy.frombuffer(start[3], numpy.uint8) for start in starts], numpy.int8) - 1
+    boards      = boards.reshape(gameCount, BOARD_WIDTH, BOARD_HEIGHT)
+    fillArray   = numpy.array(fills, numpy.int8)
+    canMove     = canMakeMoveBatch(boards) # Only changes when a game's board does.
+    ranOut      = numpy.zeros(gameCount, bool) # Games that ended because their fills ran out.
+    active      = turns < MAX_GAME_LENGTH
+    firstSpaces, secondSpaces = numpy.array([(first, -1 if second is None else second) for first, second, swapIndex, horizontal in MOVE_SWAPS]).T
+
+    while active.any():
+        games = numpy.nonzero(active)[0]
+        if len(games) < BATCH_MIN_GAMES:
+            # Too few games are left to be worth playing in lockstep.
+            for game in games:
+                start = (int(turns[game]), int(scores[game]), int(fillIndexes[game]),
+                         (boards[game] + 1).astype(numpy.uint8).tobytes())
+                scores[game], turns[game] = simulate(movesList[game], board, fills, None, start,
+                                                     None if snapshots is None else snapshots[game])
+            break
+        if snapshots is not None:
+            for game in games[turns[games] % SNAPSHOT_INTERVAL == 0]:
+                snapshots[game].append((int(turns[game]), int(scores[game]), int(fillIndexes[game]),
+                                        (boards[game] + 1).astype(numpy.uint8).tobytes()))
+
+        # Swap the veggies of each game's next move.
+        codes = moves[games, turns[games]]
+        turns[games] += 1
+        first  = firstSpaces[codes]
+        second = secondSpaces[codes]
+        if (second < 0).any():
+            raise IndexError('list index out of range') # A move swaps with a space past the board.
+        swapped = boards[games].reshape(len(games), -1)
+        rows = numpy.arange(len(games))
+        firstVeggies = swapped[rows, first]
+        swapped[rows, first]  = swapped[rows, second]
+        swapped[rows, second] = firstVeggies
+        swapped = swapped.reshape(len(games), BOARD_WIDTH, BOARD_HEIGHT)
+
+        # Games whose swap made no match keep their old board.
+        matching, removals, points = findBatchMatches(swapped)
+        if matching.any():
+            # Remove the matches and refill the boards until there are no more.
+            cascadeGames = games[matching]
+            cascading = swapped[matching]
+            scoreAdds = numpy.zeros(len(cascadeGames), numpy.int64)
+            live = numpy.arange(len(cascadeGames)) # The boards in cascading that still have matches.
+            while len(live):
+                scoreAdds[live] += points
+                scores[cascadeGames[live]] += scoreAdds[live]
+                liveBoards = cascading[live]
+                liveBoards[removals] = EMPTY_SPACE
+                liveBoards, used, short = fillBatch(liveBoards, fillIndexes[cascadeGames[live]], fillArray)
+                fillIndexes[cascadeGames[live]] += used
+                cascading[live] = liveBoards
+                if short.any():
+                    # The fills ran out, which ends those games.
+                    ranOut[cascadeGames[live[short]]] = True
+                    live       = live[~short]
+                    liveBoards = liveBoards[~short]
+                    if len(live) == 0:
+                        break
+                matching, removals, points = findBatchMatches(liveBoards)
+                live = live[matching]
+            boards[cascadeGames] = cascading
+            canMove[cascadeGames] = canMakeMoveBatch(cascading)
+
+        active[games] = (turns[games] < MAX_GAME_LENGTH) & canMove[games] & ~ranOut[games]
+
+    return [(int(scores[game]), int(turns[game])) for game in range(gameCount)]
+
+# Does the same as resumeGame() for many games at once.
+def resumeBatch(tasks, board, fills):
+    snapshots = [[] for task in tasks]
+    results = simulateBatch([moves for moves, start in tasks], board, fills, [start for moves, start in tasks], snapshots)
+    return [(score, turns, snapshots[game], None, None) for game, (score, turns) in enumerate(results)]
+
+# Returns True if batches of gameCount games are played with simulateBatch().
+def useBatch(gameCount):
+    return numpy is not None and gameCount >= BATCH_MIN_GAMES
+
+# Returns (matching, removals, points) for a (games, BOARD_WIDTH, BOARD_HEIGHT) array
+# of boards: a mask of the boards with matches and, for each of those, a mask of the
+# spaces findMatchingVeggies() would return and the points its matches score, summing
+# 10 + (len(run) - 3) * 10 over the runs.
+def findBatchMatches(boards):
+    veggies    = boards != EMPTY_SPACE
+    alikeBelow = (boards[:, :, :-1] == boards[:, :, 1:]) & veggies[:, :, 1:] # The veggie below is the same.
+    alikeRight = (boards[:, :-1, :] == boards[:, 1:, :]) & veggies[:, 1:, :] # The veggie to the right is the same.
+    vertical   = alikeBelow[:, :, :-1] & alikeBelow[:, :, 1:]                # A vertical triplet starts here.
+    horizontal = alikeRight[:, :-1, :] & alikeRight[:, 1:, :]                # A horizontal triplet starts here.
+    matching   = vertical.any(axis=(1, 2)) | horizontal.any(axis=(1, 2))
+    if not matching.all():
+        boards, alikeBelow, alikeRight, vertical, horizontal = \
+            boards[matching], alikeBelow[matching], alikeRight[matching], vertical[matching], horizontal[matching]
+
+    verticalRuns   = numpy.zeros(boards.shape, bool)
+    horizontalRuns = numpy.zeros(boards.shape, bool)
+    for offset in range(3):
+        verticalRuns[:, :, offset:BOARD_HEIGHT - 2 + offset]  |= vertical
+        horizontalRuns[:, offset:BOARD_WIDTH - 2 + offset, :] |= horizontal
+
+    # A run starts at a triplet that doesn't continue one from the space before it,
+    # and scores 10 points for each of its veggies after the first two.
+    runCount = vertical[:, :, 0].sum(axis=1) + horizontal[:, 0, :].sum(axis=1)
+    runCount += (vertical[:, :, 1:] & ~alikeBelow[:, :, :BOARD_HEIGHT - 3]).sum(axis=(1, 2))
+    runCount += (horizontal[:, 1:, :] & ~alikeRight[:, :BOARD_WIDTH - 3, :]).sum(axis=(1, 2))
+    points   = 10 * (verticalRuns.sum(axis=(1, 2)) + horizontalRuns.sum(axis=(1, 2)) - 2 * runCount)
+    removals = verticalRuns | horizontalRuns
+
+    # Where runs cross, the scan in findMatchingVeggiesReference() decides which veggies
+    # belong to which run, so it is left to decide for those boards.
+    for game in numpy.nonzero((verticalRuns & horizontalRuns).any(axis=(1, 2)))[0]:
+        removals[game] = False
+        points[game] = 0
+        for removeSet in findMatchingVeggiesReference(boards[game].tolist()):
+            points[game] += 10 + (len(removeSet) - 3) * 10
+            for x, y in removeSet:
+                removals[game, x, y] = True
+    return matching, removals, points
+
+# Does the same as GameState.fillAtOnce() to a (games, BOARD_WIDTH, BOARD_HEIGHT)
+# array of boards, where each game takes fills from its own fillIndex. Returns the
+# filled boards, the number of fills each game used and a mask of the games whose
+# fills ran out, where GameState.fill() would raise IndexError. Their boards are
+# filled with the last fill past the end.
+def fillBatch(boards, fillIndexes, fillArray):
+    empty  = boards == EMPTY_SPACE
+    counts = empty.sum(axis=2)
+    # A stable sort of each column on whether its spaces are empty pulls its veggies down.
+    settled = numpy.take_along_axis(boards, numpy.argsort(~empty, axis=2, kind='stable'), axis=2)
+    firstFills = fillIndexes[:, None] + numpy.cumsum(counts, axis=1) - counts
+    rows = numpy.arange(BOARD_HEIGHT)
+    newSpaces = rows < counts[:, :, None]
+    # A column's first new veggie ends up lowest.
+    fillNumbers = (firstFills + counts)[:, :, None] - 1 - rows
+    fillNumbers = fillNumbers[newSpaces]
+    used  = counts.sum(axis=1)
+    short = fillIndexes + used > len(fillArray)
+    if short.any():
+        fillNumbers = numpy.minimum(fillNumbers, len(fillArray) - 1)
+    settled[newSpaces] = fillArray[fillNumbers]
+    return settled, used, short
+
+# Does the same as canMakeMoveReference() for each of a (games, BOARD_WIDTH, BOARD_HEIGHT)
+# array of boards.
+def canMakeMoveBatch(boards):
+    canMove = numpy.zeros(len(boards), bool)
+    for offsets in ONE_OFF_PATTERNS:
+        width  = BOARD_WIDTH  - max(dx for dx, dy in offsets)
+        height = BOARD_HEIGHT - max(dy for dx, dy in offsets)
+        (x0, y0), (x1, y1), (x2, y2) = offsets
+        first = boards[:, x0:x0 + width, y0:y0 + height]
+        canMove |= ((first == boards[:, x1:x1 + width, y1:y1 + height]) &
+                    (first == boards[:, x2:x2 + width, y2:y2 + height])).any(axis=(1, 2))
+    return canMove
+
+
+''' Board logic '''
+
+def getSwappingVeggies_AI(board, move):
+    if DEBUG: print("getSwappingVeggies_AI")
+
+    x = move[0]
+    y = move[1]
+    movex = 0
+    movey = 0
+    if move[2] == LEFT:
+        movex = -1
+    elif move[2] == RIGHT:
+        movex = 1
+    elif move[2] == DOWN:
+        movey = 1
+    elif move[2] == UP:
+        movey = -1
+
+    firstVeggie = {'imageNum': board[x][y],
+                'x': x,
+                'y': y}
+    secondVeggie = {'imageNum': board[x + movex][y + movey],
+                 'x': x + movex,
+                 'y': y + movey}
+
+    firstVeggie['direction'] = move[2]
+    if move[2] == LEFT:
+        secondVeggie['direction'] = RIGHT
+    elif move[2] == RIGHT:
+        secondVeggie['direction'] = LEFT
+    elif move[2] == DOWN:
+        secondVeggie['direction'] = UP
+    elif move[2] == UP:
+        secondVeggie['direction'] = DOWN
+
+    return(firstVeggie, secondVeggie)
+
+# Returns True if there are moves left, False otherwise.
+def canMakeMove(board):
+    if BOARD_BACKEND == BITBOARD_BACKEND:
+        return canMakeMoveOnBitboards(getBitboards(board))
+    return canMakeMoveReference(board)
+
+# The original space-by-space search for moves, kept as the reference for canMakeMove().
+def canMakeMoveReference(board):
+    # The patterns in oneOffPatterns represent veggies that are configured
+    # in a way where it only takes one move to make a triplet.
+    oneOffPatterns = (((0,1), (1,0), (2,0)),
+                      ((0,1), (1,1), (2,0)),
+                      ((0,0), (1,1), (2,0)),
+                      ((0,1), (1,0), (2,1)),
+                      ((0,0), (1,0), (2,1)),
+                      ((0,0), (1,1), (2,1)),
+                      ((0,0), (0,2), (0,3)),
+                      ((0,0), (0,1), (0,3)))
+
+    # The x and y variables iterate over each space on the board.
+    # If we use + to represent the currently iterated space on the
+    # board, then this pattern: ((0,1), (1,0), (2,0))refers to identical
+    # veggies being set up like this:
+    #
+    #     +A
+    #     B
+    #     C
+    #
+    # That is, veggie A is offset from the + by (0,1), veggie B is offset
+    # by (1,0), and veggie C is offset by (2,0). In this case, veggie A can
+    # be swapped to the left to form a vertical three-in-a-row triplet.
+    #
+    # There are eight possible ways for the veggies to be one move
+    # away from forming a triple, hence oneOffPattern has 8 patterns.
+
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT):
+            for pat in oneOffPatterns:
+                # check each possible pattern of "match in next move" to
+                # see if a possible move can be made.
+                if (getVeggieAt(board, x+pat[0][0], y+pat[0][1]) == \
+                    getVeggieAt(board, x+pat[1][0], y+pat[1][1]) == \
+                    getVeggieAt(board, x+pat[2][0], y+pat[2][1]) != None) or \
+                   (getVeggieAt(board, x+pat[0][1], y+pat[0][0]) == \
+                    getVeggieAt(board, x+pat[1][1], y+pat[1][0]) == \
+                    getVeggieAt(board, x+pat[2][1], y+pat[2][0]) != None):
+                    return True # return True the first time you find a pattern
+    return False
+
+def pullDownAllVeggies(board):
+    if DEBUG: print("Pull down all veggies")
+    # pulls down veggies on the board to the bottom to fill in any gaps
+    for x in range(BOARD_WIDTH):
+        veggiesInColumn = []
+        for y in range(BOARD_HEIGHT):
+            if board[x][y] != EMPTY_SPACE:
+                veggiesInColumn.append(board[x][y])
+        board[x] = ([EMPTY_SPACE] * (BOARD_HEIGHT - len(veggiesInColumn))) + veggiesInColumn
+
+
+def getVeggieAt(board, x, y):
+    #if DEBUG: print("getVeggieAt" + str(x) + "," + str(y))
+    if x < 0 or y < 0 or x >= BOARD_WIDTH or y >= BOARD_HEIGHT:
+        return None
+    else:
+        return board[x][y]
+
+
+# Returns the drop slots and the fillIndex of the next unused veggie in fill_list.
+def getDropSlots(board, fill_list, fillIndex):
+    if DEBUG: print("getDropSlots")
+    # Creates a "drop slot" for each column and fills the slot with a
+    # number of veggies that that column is lacking. This function assumes
+    # that the veggies have been gravity dropped already.
+    boardCopy = [column[:] for column in board]
+    pullDownAllVeggies(boardCopy)
+
+    dropSlots = []
+    for i in range(BOARD_WIDTH):
+        dropSlots.append([])
+
+    # count the number of empty spaces in each column on the board
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT-1, -1, -1): # start from bottom, going up
+            if boardCopy[x][y] == EMPTY_SPACE:
+                newVeggie = fill_list[fillIndex]
+                fillIndex += 1
+                boardCopy[x][y] = newVeggie
+                dropSlots[x].append(newVeggie)
+    return dropSlots, fillIndex
+
+
+# Returns a list of lists of veggies in matching triplets that should be removed.
+def findMatchingVeggies(board):
+    # Each space of the board is compared with the spaces one and two steps along its
+    # column and its row to find the runs of 3 or more identical veggies. As long as no
+    # veggie is in both a horizontal and a vertical run, the runs are exactly what the
+    # space-by-space scan in findMatchingVeggiesReference() would find, so they are
+    # returned in its order. Crossing runs are rare, and are left to that scan.
+    # On an 8x8 list board this takes a quarter to a third of the time of the original
+    # deep-copying scan, not a tenth: packing the board into bitboards and building the
+    # lists of spaces are still done a space at a time in Python. Games go through
+    # GameState.findMatches() instead, which keeps its bitboards up to date as it plays
+    # and never searches after a swap that makes no match.
+    if BOARD_BACKEND == REFERENCE_BACKEND:
+        return findMatchingVeggiesReference(board)
+    if BOARD_BACKEND == BITBOARD_BACKEND:
+        verticalRuns, horizontalRuns = getBitboardRuns(getBitboards(board))
+    elif numpy is not None and (isinstance(board, numpy.ndarray) or BOARD_WIDTH * BOARD_HEIGHT >= NUMPY_MIN_CELLS):
+        boardArray = numpy.asarray(board, numpy.int8)
+        verticalRuns   = getArrayRuns(boardArray)
+        horizontalRuns = [(x, y, length) for y, x, length in getArrayRuns(boardArray.T)]
+    else:
+        packedLines    = packLines(board)
+        verticalRuns   = getPackedRuns(packedLines, VERTICAL_TRIPLE, 1)
+        horizontalRuns = getPackedRuns(packedLines, HORIZONTAL_TRIPLE, LINE_STEP)
+
+    removeSets = getRemoveSets(verticalRuns, horizontalRuns)
+    if removeSets is None:
+        # Runs cross; the scan decides which veggies belong to which run.
+        if isinstance(board, list):
+            return findMatchingVeggiesReference(board)
+        return findMatchingVeggiesReference(numpy.asarray(board).tolist())
+    return removeSets
+
+# Returns the runs of findMatchingVeggies() as lists of spaces, in the order that
+# findMatchingVeggiesReference() finds them, or None if any of them cross.
+def getRemoveSets(verticalRuns, horizontalRuns):
+    if verticalRuns == [] and horizontalRuns == []:
+        return []
+
+    veggiesToRemove = []
+    if horizontalRuns != []:
+        spaces = set()
+        for x, y, length in horizontalRuns:
+            removeSet = [(x + offset, y) for offset in range(length)]
+            spaces.update(removeSet)
+            veggiesToRemove.append(((x, y), removeSet))
+    for x, y, length in verticalRuns:
+        removeSet = [(x, y + offset) for offset in range(length)]
+        if horizontalRuns != [] and not spaces.isdisjoint(removeSet):
+            return None
+        veggiesToRemove.append(((x, y), removeSet))
+
+    # The scan finds each run at its first space, going through the board column by column.
+    veggiesToRemove.sort()
+    return [removeSet for start, removeSet in veggiesToRemove]
+
+# Packs the columns of a board into one string of bytes, one byte per space (the
+# veggie plus 1), with a 0 byte after each column so no run can wrap onto the next.
+def packLines(board):
+    return bytes([veggie + 1 for column in board for veggie in column + LINE_END])
+
+# Returns (x, y, length) for each run of 3 or more identical veggies that pattern
+# finds in lines packed by packLines(), where the spaces of a run are step bytes apart.
+def getPackedRuns(packedLines, pattern, step):
+    runs = []
+    for match in pattern.finditer(packedLines):
+        start = match.start()
+        veggie = packedLines[start]
+        if start >= step and packedLines[start - step] == veggie:
+            continue # the middle of a run that was already found
+        end = start + 3 * step
+        while end < len(packedLines) and packedLines[end] == veggie:
+            end += step
+        x, y = divmod(start, LINE_STEP)
+        runs.append((x, y, (end - start) // step))
+    return runs
+
+# Returns (line, start, length) for each run of 3 or more identical veggies in the rows
+# of a 2-D numpy array.
+def getArrayRuns(lines):
+    triples = (lines[:, :-2] == lines[:, 1:-1]) & (lines[:, 1:-1] == lines[:, 2:]) & (lines[:, :-2] != EMPTY_SPACE)
+    runs = []
+    lastLine = -1
+    end      = 0
+    for i, start in zip(*numpy.nonzero(triples)):
+        if i != lastLine:
+            lastLine = i
+            end      = 0
+        if start >= end:
+            end = start + 3
+            while end < lines.shape[1] and lines[i, end] == lines[i, start]:
+                end += 1
+            runs.append((int(i), int(start), int(end - start)))
+    return runs
+
+# The original space-by-space search for matches, kept as the reference for findMatchingVeggies().
+def findMatchingVeggiesReference(board):
+    veggiesToRemove = [] # a list of lists of veggies in matching triplets that should be removed
+    boardCopy = [column[:] for column in board]
+
+    # loop through each space, checking for 3 adjacent identical veggies
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT):
+            # look for horizontal matches
+            if getVeggieAt(boardCopy, x, y) == getVeggieAt(boardCopy, x + 1, y) == getVeggieAt(boardCopy, x + 2, y) and getVeggieAt(boardCopy, x, y) != EMPTY_SPACE:
+                targetVeggie = boardCopy[x][y]
+                offset = 0
+                removeSet = []
+                while getVeggieAt(boardCopy, x + offset, y) == targetVeggie:
+                    # keep checking if there's more than 3 veggies in a row
+                    removeSet.append((x + offset, y))
+                    boardCopy[x + offset][y] = EMPTY_SPACE
+                    offset += 1
+                veggiesToRemove.append(removeSet)
+
+            # look for vertical matches
+            if getVeggieAt(boardCopy, x, y) == getVeggieAt(boardCopy, x, y + 1) == getVeggieAt(boardCopy, x, y + 2) and getVeggieAt(boardCopy, x, y) != EMPTY_SPACE:
+                targetVeggie = boardCopy[x][y]
+                offset = 0
+                removeSet = []
+                while getVeggieAt(boardCopy, x, y + offset) == targetVeggie:
+                    # keep checking, in case there's more than 3 veggies in a row
+                    removeSet.append((x, y + offset))
+                    boardCopy[x][y + offset] = EMPTY_SPACE
+                    offset += 1
+                veggiesToRemove.append(removeSet)
+
+    return veggiesToRemove
+
+
+def getDroppingVeggies(board):
+    if DEBUG: print("getDroppingVeggies")
+    # Find all the veggies that have an empty space below them
+    boardCopy = [column[:] for column in board]
+    droppingVeggies = []
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT - 2, -1, -1):
+            if boardCopy[x][y + 1] == EMPTY_SPACE and boardCopy[x][y] != EMPTY_SPACE:
+                # This space drops if not empty but the space below it is
+                droppingVeggies.append( {'imageNum': boardCopy[x][y], 'x': x, 'y': y, 'direction': DOWN} )
+                boardCopy[x][y] = EMPTY_SPACE
+    return droppingVeggies
+
+
+def moveVeggies(board, movingVeggies):
+    if DEBUG: print("moveVeggies")
+    # movingVeggies is a list of dicts with keys x, y, direction, imageNum
+    for veggie in movingVeggies:
+        if veggie['y'] != HIDDEN_ROW:
+            board[veggie['x']][veggie['y']] = EMPTY_SPACE
+            movex = 0
+            movey = 0
+            if veggie['direction'] == LEFT:
+                movex = -1
+            elif veggie['direction'] == RIGHT:
+                movex = 1
+            elif veggie['direction'] == DOWN:
+                movey = 1
+            elif veggie['direction'] == UP:
+                movey = -1
+            board[veggie['x'] + movex][veggie['y'] + movey] = veggie['imageNum']
+        else:
+            # veggie is located above the board (where new veggies come from)
+            board[veggie['x']][0] = veggie['imageNum'] # move to top row
+
+
+def getBoardCopyMinusVeggies(board, veggies):
+    # Creates and returns a copy of the passed board data structure,
+    # with the veggies in the "veggies" list removed from it.
+    #
+    # Veggies is a list of dicts, with keys x, y, direction, imageNum
+
+    boardCopy = [column[:] for column in board]
+
+    # Remove some of the veggies from this board data structure copy.
+    for veggie in veggies:
+        if veggie['y'] != HIDDEN_ROW:
+            boardCopy[veggie['x']][veggie['y']] = EMPTY_SPACE
+    return boardCopy
+
+
+''' Bitboards '''
+
+# Space (x, y) of the board is bit x * BOARD_HEIGHT + y of a bitboard, so the space
+# below a veggie is 1 bit up and the space to its right is BOARD_HEIGHT bits up.
+
+# Bitboards are built from strings of '0' and '1', highest bit first, rather than by
+# setting one bit at a time: each bit set in a Python int copies the whole int, which
+# makes building the bitboards of a large board quadratic in its size.
+
+# Returns a bitboard of the spaces from which every (dx, dy) in offsets is on the board.
+def getOriginMask(offsets):
+    bits = []
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT):
+            inside = all(0 <= x + dx < BOARD_WIDTH and 0 <= y + dy < BOARD_HEIGHT for dx, dy in offsets)
+            bits.append('1' if inside else '0')
+    return int(''.join(reversed(bits)), 2)
+
+# Returns (shifts, origins) for a pattern of offsets. ANDing a bitboard shifted right by
+# each of the shifts with origins leaves the spaces where the pattern is complete.
+def getPatternShifts(offsets):
+    return tuple(dx * BOARD_HEIGHT + dy for dx, dy in offsets), getOriginMask(offsets)
+
+# Returns (offset, horizontal) for the swap that completes a pattern of offsets: the
+# offset of the left or upper space of the swap, and whether it swaps with the space
+# to its right rather than the one below it.
+def getPatternSwap(offsets):
+    for mover in offsets:
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            target = (mover[0] + dx, mover[1] + dy)
+            line = sorted([offset for offset in offsets if offset != mover] + [target])
+            if target not in offsets and line in ([(line[0][0] + i, line[0][1]) for i in range(3)],
+                                                  [(line[0][0], line[0][1] + i) for i in range(3)]):
+                return min(mover, target), dy == 0
+
+# The oneOffPatterns of canMakeMoveReference() in both orientations. Their shifts and
+# origins depend on the board size, so they are worked out by setBoardSize().
+ONE_OFF_PATTERNS = [offsets
+                    for pattern in (((0,1), (1,0), (2,0)),
+                                    ((0,1), (1,1), (2,0)),
+                                    ((0,0), (1,1), (2,0)),
+                                    ((0,1), (1,0), (2,1)),
+                                    ((0,0), (1,0), (2,1)),
+                                    ((0,0), (1,1), (2,1)),
+                                    ((0,0), (0,2), (0,3)),
+                                    ((0,0), (0,1), (0,3)))
+                    for offsets in (list(pattern), [(dy, dx) for dx, dy in pattern])]
+
+# Translation tables from a board packed by packBoard() to the '0' and '1' of the
+# bitboard of one veggie type; the table for veggie is BIT_TABLES[veggie + 1].
+BIT_TABLES = [bytes(ord('1') if packed == veggie + 1 else ord('0') for packed in range(256)) for veggie in range(-1, NUM_VEGGIES)]
+
+# Returns a list of bitboards, one per veggie type, followed by one of the empty spaces.
+def getBitboards(board):
+    return getPackedBitboards(packBoard(board))
+
+# Returns the bitboards of a board packed by packBoard(), as getBitboards() does.
+def getPackedBitboards(packedBoard):
+    highestFirst = packedBoard[::-1]
+    # EMPTY_SPACE is -1, so empty spaces go in the last bitboard.
+    return [int(highestFirst.translate(BIT_TABLES[veggie + 1]), 2) for veggie in list(range(NUM_VEGGIES)) + [EMPTY_SPACE]]
+
+# Does the same as canMakeMoveReference() with the bitboards of a board.
+def canMakeMoveOnBitboards(bitboards):
+    for bitboard in bitboards:
+        for (a, b, c), origins in ONE_OFF_SHIFTS:
+            if (bitboard >> a) & (bitboard >> b) & (bitboard >> c) & origins:
+                return True
+    return False
+
+# Returns (rightSwaps, downSwaps) for the bitboard of one veggie type: the spaces whose
+# veggie can be swapped with the one to its right, or the one below it, to make a
+# triplet of that type.
+def getSwapBitboards(bitboard):
+    rightSwaps = 0
+    downSwaps  = 0
+    for (a, b, c), origins, swapShift, horizontal in SWAP_SHIFTS:
+        complete = (bitboard >> a) & (bitboard >> b) & (bitboard >> c) & origins
+        if complete:
+            if horizontal:
+                rightSwaps |= complete << swapShift
+            else:
+                downSwaps |= complete << swapShift
+    return rightSwaps, downSwaps
+
+# Returns (verticalRuns, horizontalRuns), lists of (x, y, length) for each run of 3 or
+# more identical veggies in the bitboards of a board.
+def getBitboardRuns(bitboards):
+    verticalRuns   = []
+    horizontalRuns = []
+    for bitboard in bitboards[:-1]:
+        # A run starts at the triplet whose space before it holds another veggie.
+        triplets = bitboard & (bitboard >> 1) & (bitboard >> 2) & VERTICAL_ORIGINS
+        if triplets:
+            starts = triplets & ~((bitboard << 1) & BELOW_TOP_ROW)
+            addBitboardRuns(verticalRuns, bitboard, starts, 1, BOARD_HEIGHT)
+        triplets = bitboard & (bitboard >> BOARD_HEIGHT) & (bitboard >> 2 * BOARD_HEIGHT) & HORIZONTAL_ORIGINS
+        if triplets:
+            starts = triplets & ~(bitboard << BOARD_HEIGHT)
+            addBitboardRuns(horizontalRuns, bitboard, starts, BOARD_HEIGHT, BOARD_WIDTH)
+    return verticalRuns, horizontalRuns
+
+# Adds (x, y, length) to runs for each set bit in starts, following the run through
+# bitboard step bits at a time until it ends or reaches the end of a line lineLength long.
+def addBitboardRuns(runs, bitboard, starts, step, lineLength):
+    # The bits are read from strings, lowest bit first, since shifting a large bitboard
+    # to read each bit copies the whole bitboard.
+    startBits = getSetBits(starts)
+    bits      = getSetBits(bitboard)
+    start = startBits.find('1')
+    while start != -1:
+        x, y = divmod(start, BOARD_HEIGHT)
+        position = y if step == 1 else x
+        length = 3
+        while position + length < lineLength and bits[start + length * step:start + length * step + 1] == '1':
+            length += 1
+        runs.append((x, y, length))
+        start = startBits.find('1', start + 1)
+
+# Returns the bits of a bitboard as a string of '0' and '1', lowest bit first.
+def getSetBits(bitboard):
+    return bin(bitboard)[:1:-1]
+
+
+''' Board size '''
+
+# Sets the size of the board that every game is played on, and works out again the
+# tables that depend on it. Boards are generated and played at the size set last;
+# 8 x 8 until this is called.
+def setBoardSize(width, height):
+    global BOARD_WIDTH, BOARD_HEIGHT, LINE_STEP, HORIZONTAL_TRIPLE, MOVE_BITS, MOVE_TYPECODE
+    global DECODED_MOVES, MOVE_SWAPS, ONE_OFF_SHIFTS, SWAP_SHIFTS, VERTICAL_ORIGINS, HORIZONTAL_ORIGINS, BELOW_TOP_ROW
+    if not (3 <= width <= MAX_BOARD_SIZE and 3 <= height <= MAX_BOARD_SIZE):
+        raise ValueError("Boards are 3 to " + str(MAX_BOARD_SIZE) + " spaces across, not " + str(width) + " x " + str(height) + ".")
+    BOARD_WIDTH  = width
+    BOARD_HEIGHT = height
+
+    LINE_STEP = BOARD_HEIGHT + 1 # Bytes between horizontal neighbours in packed lines.
+    HORIZONTAL_TRIPLE = re.compile(('(?=([^\\x00]).{%d}\\1.{%d}\\1)' % (LINE_STEP - 1, LINE_STEP - 1)).encode(), re.DOTALL)
+
+    MOVE_BITS     = getMoveBits(width, height)
+    MOVE_TYPECODE = getMoveTypecode(width, height)
+    DECODED_MOVES = [decodeMove(code) for code in range(4 << (2 * MOVE_BITS))]
+    MOVE_SWAPS    = [getMoveSwap(code) for code in range(4 << (2 * MOVE_BITS))]
+
+    ONE_OFF_SHIFTS = [getPatternShifts(offsets) for offsets in ONE_OFF_PATTERNS]
+    # (shifts, origins, swapShift, horizontal) for each pattern; a complete pattern shifted
+    # left by swapShift is the left or upper space of the swap that makes its triplet.
+    SWAP_SHIFTS    = [getPatternShifts(offsets) + (swap[0] * BOARD_HEIGHT + swap[1], horizontal)
+                      for offsets in ONE_OFF_PATTERNS
+                      for swap, horizontal in [getPatternSwap(offsets)]]
+    VERTICAL_ORIGINS   = getOriginMask(((0,0), (0,1), (0,2))) # Spaces that can start a vertical triplet.
+    HORIZONTAL_ORIGINS = getOriginMask(((0,0), (1,0), (2,0))) # Spaces that can start a horizontal triplet.
+    BELOW_TOP_ROW      = getOriginMask(((0,-1),))             # Spaces with another space above them.
+
+setBoardSize(BOARD_WIDTH, BOARD_HEIGHT)
+
+
+''' Game state '''
+
+# The board of a game being played, kept in one flat list that is allocated once, with
+# space (x, y) at index x * BOARD_HEIGHT + y, the same as its bit in a bitboard.
+#
+# Changes to the board are written to an undo journal, so a move can be rolled back
+# without copying the board. With the bitboard backend, the state also keeps the
+# board's bitboards and, for each veggie type, the swaps that would make a triplet of
+# it. Every triplet on the board goes through the dirty region: the spaces changed
+# since matches were last searched for. After a swap or a cascade, only the veggie
+# types in it are searched for matches, and only the swaps of the veggie types that
+# changed are worked out again. With any other BOARD_BACKEND, the whole board is
+# searched every time.
+class GameState(object):
+    def __init__(self, board=None):
+        self.spaces    = [EMPTY_SPACE] * (BOARD_WIDTH * BOARD_HEIGHT)
+        self.journal   = [] # (index, oldVeggie) pairs, flattened, since the last commit().
+        self.bitboards = None
+        self.swaps     = None
+        self.dirty     = 0
+        if board is not None:
+            self.setBoard(board)
+
+    # Replaces the whole board with a list of columns.
+    def setBoard(self, board):
+        for x in range(BOARD_WIDTH):
+            self.spaces[x * BOARD_HEIGHT:(x + 1) * BOARD_HEIGHT] = board[x]
+        self.reset()
+
+    # Returns a copy of the board as a list of columns.
+    def getBoard(self):
+        return [self.spaces[i:i + BOARD_HEIGHT] for i in range(0, BOARD_WIDTH * BOARD_HEIGHT, BOARD_HEIGHT)]
+
+    # Returns the board packed the way packBoard() packs it.
+    def snapshot(self):
+        return bytes([veggie + 1 for veggie in self.spaces])
+
+    # Puts back a board returned by snapshot() or packBoard().
+    def restore(self, packedBoard):
+        self.spaces[:] = [veggie - 1 for veggie in packedBoard]
+        self.reset()
+
+    # Works out the bitboards again after the whole board has changed.
+    def reset(self):
+        del self.journal[:]
+        if BOARD_BACKEND == BITBOARD_BACKEND:
+            self.bitboards = getPackedBitboards(self.snapshot())
+            self.swaps = [None] * len(self.bitboards) # (rightSwaps, downSwaps) per type, None when out of date.
+            self.dirty = (1 << len(self.spaces)) - 1
+            if self.findMatches() != []:
+                self.dirty = (1 << len(self.spaces)) - 1
+
+    # Puts veggie in the space at flat index i.
+    def setVeggie(self, i, veggie):
+        oldVeggie = self.spaces[i]
+        if oldVeggie != veggie:
+            self.journal.append(i)
+            self.journal.append(oldVeggie)
+            self.changeVeggie(i, oldVeggie, veggie)
+
+    def changeVeggie(self, i, oldVeggie, veggie):
+        self.spaces[i] = veggie
+        if self.bitboards is not None:
+            bit = 1 << i
+            self.bitboards[oldVeggie] &= ~bit
+            self.bitboards[veggie]    |= bit
+            self.swaps[oldVeggie] = None
+            self.swaps[veggie]    = None
+            self.dirty |= bit
+
+    # Returns the length of the undo journal, to undo() back to later.
+    def mark(self):
+        return len(self.journal)
+
+    # Rolls the board back to the way it was when mark() returned position.
+    def undo(self, position):
+        journal = self.journal
+        while len(journal) > position:
+            oldVeggie = journal.pop()
+            i = journal.pop()
+            self.changeVeggie(i, self.spaces[i], oldVeggie)
+
+    # Forgets the undo journal.
+    def commit(self):
+        del self.journal[:]
+
+    # Swaps the veggies at flat indices i and j if that makes a match, and returns the
+    # matches as findMatchingVeggies() does. Returns [] and leaves the board as it was
+    # otherwise. swapIndex is the index of the bit of the left or upper space of the swap
+    # in the swap bitboards, or None if the spaces aren't neighbours.
+    def trySwap(self, i, j, swapIndex, horizontal):
+        if self.bitboards is not None and self.dirty == 0 and swapIndex is not None:
+            # There are no triplets on the board, so the swap index has the answer.
+            if not self.isMatchingSwap(i, j, swapIndex, horizontal):
+                return []
+        position = self.mark()
+        firstVeggie = self.spaces[i]
+        self.setVeggie(i, self.spaces[j])
+        self.setVeggie(j, firstVeggie)
+        matchedVeggies = self.findMatches()
+        if matchedVeggies == []:
+            self.undo(position)
+        return matchedVeggies
+
+    # Returns True if swapping the veggies at flat indices i and j would make a triplet.
+    def isMatchingSwap(self, i, j, swapIndex, horizontal):
+        for veggie in (self.spaces[i], self.spaces[j]):
+            if veggie != EMPTY_SPACE and self.getSwaps(veggie)[0 if horizontal else 1] >> swapIndex & 1:
+                return True
+        return False
+
+    # Returns the matches on the board as findMatchingVeggies() does. The caller must
+    # empty every space in them before looking for matches again.
+    def findMatches(self):
+        if self.bitboards is None:
+            return findMatchingVeggies(self.getBoard())
+        bitboards = [bitboard if bitboard & self.dirty else 0 for bitboard in self.bitboards]
+        self.dirty = 0
+        verticalRuns, horizontalRuns = getBitboardRuns(bitboards)
+        removeSets = getRemoveSets(verticalRuns, horizontalRuns)
+        if removeSets is None:
+            return findMatchingVeggiesReference(self.getBoard())
+        return removeSets
+
+    # Returns True if there are moves left, False otherwise.
+    def canMakeMove(self):
+        if self.bitboards is None:
+            return canMakeMove(self.getBoard())
+        for swaps in self.swaps:
+            if swaps is not None and swaps != (0, 0):
+                return True
+        for veggie in range(len(self.swaps)):
+            if self.swaps[veggie] is None and self.getSwaps(veggie) != (0, 0):
+                return True
+        return False
+
+    # Returns (rightSwaps, downSwaps): the spaces whose veggie can be swapped with the
+    # one to its right, or the one below it, to make a triplet of any type. This is
+    # the search canMakeMove() makes with the bitboard backend.
+    def getMatchingSwaps(self):
+        if self.bitboards is None:
+            bitboards = getBitboards(self.getBoard())
+            swaps = [getSwapBitboards(bitboards[veggie]) for veggie in range(NUM_VEGGIES)]
+        else:
+            swaps = [self.getSwaps(veggie) for veggie in range(NUM_VEGGIES)]
+        rightSwaps = 0
+        downSwaps  = 0
+        for veggieRight, veggieDown in swaps:
+            rightSwaps |= veggieRight
+            downSwaps  |= veggieDown
+        return rightSwaps, downSwaps
+
+    # Returns move, or the matching move nearest to it if it would make no match (see repairMove()).
+    def repairMove(self, move):
+        rightSwaps, downSwaps = self.getMatchingSwaps()
+        return repairMove(move, rightSwaps, downSwaps)
+
+    # Returns (rightSwaps, downSwaps) for a veggie type, working them out if needed.
+    def getSwaps(self, veggie):
+        if self.swaps[veggie] is None:
+            self.swaps[veggie] = getSwapBitboards(self.bitboards[veggie])
+        return self.swaps[veggie]
+
+    # Does the same as fillBoard() to this board. The veggies only drop one row at a
+    # time when there is an observer to show each row; otherwise every column is
+    # settled at once.
+    def fill(self, points, fills, fillIndex, score=0, observer=None):
+        if DEBUG: print("fillBoard")
+        if observer is None:
+            return self.fillAtOnce(fills, fillIndex)
+        return self.fillInSteps(points, fills, fillIndex, score, observer)
+
+    # Pulls the veggies of each column down and fills the spaces above them in one
+    # pass. A column's first new veggie drops first, so it ends up lowest.
+    def fillAtOnce(self, fills, fillIndex):
+        for top in range(0, BOARD_WIDTH * BOARD_HEIGHT, BOARD_HEIGHT):
+            column = self.spaces[top:top + BOARD_HEIGHT]
+            count = column.count(EMPTY_SPACE)
+            if count == 0:
+                continue
+            if fillIndex + count > len(fills):
+                raise IndexError('list index out of range') # The fills ran out.
+            newVeggies = fills[fillIndex:fillIndex + count]
+            fillIndex += count
+            y = top
+            for veggie in reversed(newVeggies):
+                self.setVeggie(y, veggie)
+                y += 1
+            for veggie in column:
+                if veggie != EMPTY_SPACE:
+                    self.setVeggie(y, veggie)
+                    y += 1
+        return fillIndex
+
+    def fillInSteps(self, points, fills, fillIndex, score, observer):
+        # Every empty space of a column takes a veggie from its drop slot, going
+        # through the columns from left to right, as getDropSlots() does.
+        dropSlots = []
+        for i in range(0, BOARD_WIDTH * BOARD_HEIGHT, BOARD_HEIGHT):
+            count = self.spaces[i:i + BOARD_HEIGHT].count(EMPTY_SPACE)
+            if fillIndex + count > len(fills):
+                raise IndexError('list index out of range') # The fills ran out.
+            dropSlots.append(fills[fillIndex:fillIndex + count])
+            fillIndex += count
+
+        while any(dropSlots):
+            # keep dropping as long as there are more veggies to drop
+            dropping = self.getDroppingSpaces()
+            if observer is not None:
+                movingVeggies = [{'imageNum': self.spaces[i], 'x': i // BOARD_HEIGHT, 'y': i % BOARD_HEIGHT, 'direction': DOWN}
+                                 for i in dropping]
+                for x in range(len(dropSlots)):
+                    if len(dropSlots[x]) != 0:
+                        movingVeggies.append({'imageNum': dropSlots[x][0], 'x': x, 'y': HIDDEN_ROW, 'direction': DOWN})
+                boardCopy = getBoardCopyMinusVeggies(self.getBoard(), movingVeggies)
+                observer((EVENT_DROP, boardCopy, movingVeggies, points, score))
+
+            for i in dropping:
+                self.setVeggie(i + 1, self.spaces[i])
+                self.setVeggie(i, EMPTY_SPACE)
+            # The lowest veggie in each drop slot moves into the top row.
+            for x in range(len(dropSlots)):
+                if len(dropSlots[x]) != 0:
+                    self.setVeggie(x * BOARD_HEIGHT, dropSlots[x].pop(0))
+        return fillIndex
+
+    # Returns the flat indices of the veggies with an empty space below them, in the
+    # order getDroppingVeggies() returns them.
+    def getDroppingSpaces(self):
+        dropping = []
+        for bottom in range(BOARD_HEIGHT - 1, BOARD_WIDTH * BOARD_HEIGHT, BOARD_HEIGHT):
+            gap = False
+            for i in range(bottom, bottom - BOARD_HEIGHT, -1):
+                if self.spaces[i] == EMPTY_SPACE:
+                    gap = True
+                elif gap:
+                    dropping.append(i)
+        return dropping
+
+
+''' Profiling '''
+
+# Wall time and call counts of each phase in PROFILE_PHASES, and counts of what
+# happened, over the games simulate() played with this profile. A phase's time
+# doesn't include the phases it calls, such as the drawing of a cascade's frames.
+class GameProfile(object):
+    def __init__(self):
+        self.times          = dict.fromkeys(PROFILE_PHASES, 0.0) # Seconds.
+        self.calls          = dict.fromkeys(PROFILE_PHASES, 0)
+        self.games          = 0
+        self.failedSwaps    = 0 # Moves that made no match and were swapped back.
+        self.cascades       = 0 # Rounds of removing matches and refilling the board.
+        self.deepestCascade = 0 # Most rounds after a single move.
+        self.fillsUsed      = 0
+        self.running        = [] # [phase, start, seconds spent in the phases it called] for each running phase.
+
+    def begin(self, phase):
+        self.running.append([phase, time.perf_counter(), 0.0])
+
+    def end(self):
+        phase, start, inner = self.running.pop()
+        elapsed = time.perf_counter() - start
+        self.times[phase] += elapsed - inner
+        self.calls[phase] += 1
+        if self.running:
+            self.running[-1][2] += elapsed
+
+    # Returns an observer that times everything but EVENT_MOVE as the render phase.
+    def timeObserver(self, observer):
+        def timedObserver(event):
+            if event[0] == EVENT_MOVE:
+                return observer(event)
+            self.begin('render')
+            try:
+                return observer(event)
+            finally:
+                self.end()
+        return timedObserver
+
+    # Adds the totals of another profile to this one.
+    def add(self, other):
+        for phase in PROFILE_PHASES:
+            self.times[phase] += other.times[phase]
+            self.calls[phase] += other.calls[phase]
+        self.games          += other.games
+        self.failedSwaps    += other.failedSwaps
+        self.cascades       += other.cascades
+        self.deepestCascade  = max(self.deepestCascade, other.deepestCascade)
+        self.fillsUsed      += other.fillsUsed
+
+    def __str__(self):
+        text = str(self.games) + " games, " + str(self.calls['swap']) + " moves:"
+        for phase in PROFILE_PHASES:
+            text += " " + phase + " " + "%.1f" % (self.times[phase] * 1000) + " ms (" + str(self.calls[phase]) + ")"
+        text += "; " + str(self.failedSwaps) + " failed swaps, " + str(self.cascades) + " cascades"
+        text += " (deepest " + str(self.deepestCascade) + "), " + str(self.fillsUsed) + " fills used."
+        return text
+
+# A GameState that adds the time spent in each phase of a move to a GameProfile.
+class ProfiledGameState(GameState):
+    def __init__(self, profile, board=None):
+        self.profile = profile
+        self.depth   = 0 # Cascades since the last swap.
+        GameState.__init__(self, board)
+
+    def trySwap(self, i, j, swapIndex, horizontal):
+        self.depth = 0
+        self.profile.begin('swap')
+        matchedVeggies = GameState.trySwap(self, i, j, swapIndex, horizontal)
+        self.profile.end()
+        if matchedVeggies == []:
+            self.profile.failedSwaps += 1
+        return matchedVeggies
+
+    def findMatches(self):
+        self.profile.begin('match')
+        matchedVeggies = GameState.findMatches(self)
+        self.profile.end()
+        return matchedVeggies
+
+    def fill(self, points, fills, fillIndex, score=0, observer=None):
+        self.profile.begin('cascade')
+        try:
+            newFillIndex = GameState.fill(self, points, fills, fillIndex, score, observer)
+        finally:
+            self.profile.end()
+        self.profile.fillsUsed += newFillIndex - fillIndex
+        self.depth += 1
+        return newFillIndex
+
+    def canMakeMove(self):
+        # Called once a move has settled.
+        self.profile.cascades += self.depth
+        self.profile.deepestCascade = max(self.profile.deepestCascade, self.depth)
+        self.depth = 0
+        self.profile.begin('canMakeMove')
+        canMove = GameState.canMakeMove(self)
+        self.profile.end()
+        return canMove
@@ -0,0 +1,983 @@
+# Veggie Saga             #
+# Genetic Algorithm       #
+
+# Never touches pygame or tkinter, so it also runs in worker processes. #
+
+""" The Genetic Algorithm and Wisdom of Crowds runs that search for good AI move
+    lists. Progress is reported to a Monitor, which the GUI replaces with one
+    that updates its window. """
+
+import random, copy, multiprocessing, collections, hashlib, threading, os, pickle, queue, sys, traceback
+from array import array
+import veggieengine
+from veggieengine import *
+
+''' Class definitions '''
+# moves is an array of MAX_GAME_LENGTH moves, one or two bytes each (see encodeMove()).
+class Genome(object):
+    __slots__ = ('moves', 'score', 'length', 'parent', 'firstChange', 'profile')
+
+    def __init__(self, moves):
+        self.moves   = moves
+        self.score   = None
+        self.length  = None
+        self.profile = None # When profiling, the GameProfile of the game played to score this genome.
+        # Until this genome is scored, parent is a genome whose moves are the same up to move firstChange.
+        self.parent      = None
+        self.firstChange = 0
+
+class Environment(object):
+    def __init__(self, board, item_stack):
+        self.board = board
+        self.item_stack = item_stack
+        self.gene_pool = []
+        self.workers = NUM_WORKERS # The number of processes used to score genomes.
+        self.fitness_pool = None # Worker processes that score genomes; started on first use.
+        self.snapshots = SnapshotCache()
+        self.fitness_cache = FitnessCache()
+        self.game_key = None # Digest of the board and item stack; the start of every fitness cache key.
+        self.profiling = PROFILE_GAMES # If True, every generation's games are timed.
+        self.repairing = REPAIR_MOVES # If True, genomes' moves that would make no match are repaired as they are scored.
+        self.profiles = [] # A GameProfile of the games played in each generation, when profiling.
+        self.expert_profiles = [] # The summed GameProfile of each expert run, when profiling.
+        self.migration = None # The Migration of an island run, which trades genomes with the other islands.
+
+    # Returns the fitness cache key of the game played with moves on this environment.
+    def getGameKey(self, moves):
+        if self.game_key is None:
+            self.game_key = hashlib.sha1(packBoard(self.board) + bytes(self.item_stack))
+        key = self.game_key.copy()
+        key.update(moves.tobytes())
+        return key.digest()
+
+    def close(self):
+        # Stops the worker processes used to score this environment's genomes.
+        if self.fitness_pool is not None:
+            self.fitness_pool.close()
+            self.fitness_pool = None
+
+# Receives the progress of a run. This one ignores it and never pauses;
+# the GUI uses its own to update the window and to pause or stop runs.
+class Monitor(object):
+    def setTitle(self, text): pass
+    def setGeneration(self, generation): pass
+    def setBestScore(self, score): pass
+    def setStatus(self, text): pass
+
+    # Called between steps of a run. Blocks while the run is paused and
+    # returns True if the run should stop.
+    def shouldStop(self):
+        return False
+
+    # Called when every expert has finished, before the combined WoC round.
+    def expertsReady(self): pass
+
+    # If this returns True, genomes are scored one at a time with playGame().
+    def watchGames(self):
+        return False
+
+    # If this returns True, expert runs are played in this process one after another,
+    # whatever the number of workers, so that the monitor can pause and watch them.
+    def followsExperts(self):
+        return False
+
+    # profile is a GameProfile that the game's timings are added to, or None. With
+    # repair, moves that would make no match are repaired in moves (see simulate()).
+    def playGame(self, moves, board, fills, profile=None, repair=False):
+        return simulate(moves, board, fills, profile=profile, repair=repair)
+
+# Pauses, resumes and stops a run from another thread. Checking a running run costs
+# two Event.is_set() calls; a paused run sleeps in Event.wait() until it is resumed
+# or stopped, and wakes up at once either way.
+class RunController(object):
+    def __init__(self, running=False):
+        self.running  = threading.Event() # Set unless the run is paused.
+        self.stopping = threading.Event() # Set once the run should stop for good.
+        if running: self.running.set()
+
+    def isRunning(self):
+        return self.running.is_set()
+
+    def pause(self):
+        if not self.stopping.is_set():
+            self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def toggle(self):
+        if self.running.is_set(): self.pause()
+        else: self.resume()
+
+    def stop(self):
+        self.stopping.set()
+        self.running.set() # Wake up a paused run so that it can see it is stopping.
+
+    # Blocks while the run is paused, calling onPause() first if it is given.
+    # Returns True if the run should stop.
+    def check(self, onPause=None):
+        if not self.running.is_set():
+            if onPause is not None: onPause()
+            self.running.wait()
+        return self.stopping.is_set()
+
+    # Sleeps for up to seconds, waking early if the run is stopped. Returns True if it was.
+    def sleep(self, seconds):
+        return self.stopping.wait(seconds)
+
+''' Constants '''
+
+GENE_POOL_SIZE   = 8     # The number of genomes in each environment in the Genetic Algorithm
+MUTATION_RATE    = 10    # The frequency (in generations) that a mutation will occur.
+GENERATION_LIMIT = 50    # The number of generations stepped through before terminating.
+NUM_WORKERS      = 0     # The number of processes used to score genomes. 0 --> One per CPU core.
+SNAPSHOT_LIMIT   = 4096  # The number of game snapshots an environment keeps for resuming offspring.
+FITNESS_CACHE_SIZE = 10000 # The number of game results remembered by a fitness cache.
+PROFILE_GAMES    = False # Time the phases of every game played (see GameProfile). Slows the run a little.
+REPAIR_MOVES     = True  # Aim every move of a genome at a matching swap when it is scored (see repairMove()).
+CHECKPOINT_INTERVAL = 10 # Generations between checkpoints of a GA run. 0 --> Only between runs.
+ISLAND_COUNT     = 4     # The number of populations evolved side by side in an island run.
+MIGRATION_INTERVAL = 10  # Generations between migrations from each island to the next.
+MIGRANT_COUNT    = 2     # The number of best genomes each island sends in a migration.
+QUIET            = False # Worker processes of expert and island runs print nothing.
+
+# Remembers the (score, length) of games that have already been played, so that a
+# genome identical to an earlier one is never simulated again. Keys come from
+# Environment.getGameKey(). It holds at most FITNESS_CACHE_SIZE results and forgets
+# the least recently used first.
+class FitnessCache(object):
+    def __init__(self):
+        self.hits    = 0
+        self.misses  = 0
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > FITNESS_CACHE_SIZE:
+            self.entries.popitem(False)
+
+    # Adds the results and counters of a cache filled in another process.
+    def merge(self, other):
+        self.hits   += other.hits
+        self.misses += other.misses
+        for key, result in other.entries.items():
+            self.put(key, result)
+
+# Keeps the snapshots taken while scoring each genome, so that its offspring can resume
+# their games from the last snapshot before their first changed move. It holds at most
+# SNAPSHOT_LIMIT snapshots; the genomes used least recently lose theirs first.
+class SnapshotCache(object):
+    def __init__(self):
+        self.count   = 0
+        self.entries = collections.OrderedDict()
+
+    # Returns the snapshots of genome taken at or before move number turn.
+    def before(self, genome, turn):
+        snapshots = self.entries.get(genome)
+        if snapshots is None:
+            return []
+        self.entries.move_to_end(genome)
+        i = len(snapshots)
+        while i > 0 and snapshots[i - 1][0] > turn:
+            i -= 1
+        return snapshots[:i]
+
+    def put(self, genome, snapshots):
+        if genome in self.entries:
+            self.count -= len(self.entries.pop(genome))
+        self.entries[genome] = snapshots
+        self.count += len(snapshots)
+        while self.count > SNAPSHOT_LIMIT and len(self.entries) > 1:
+            oldGenome, oldSnapshots = self.entries.popitem(False)
+            self.count -= len(oldSnapshots)
+
+
+''' AI Code '''
+
+# Runs GENE_POOL_SIZE independent Genetic Algorithm runs and keeps the best genome of each
+# as an expert. The expert pool then becomes the gene pool of one final, combined run.
+# The expert runs each get their own random stream and run at the same time, one per
+# worker process (unless the monitor follows them). They may finish in any order, but
+# their results are logged and pooled in run order.
+# Returns the best score of the last expert, or None if the run was stopped.
+# With a checkpoint, the run's progress is saved to it as it goes, and a run whose
+# checkpoint was loaded from disk carries on from where it was saved.
+def runWisdomOfCrowds(envir, log, monitor=None, rng=random, checkpoint=None):
+    if monitor is None: monitor = Monitor()
+    # Initialize variables
+    bestScore = 0
+    expert_pool = []
+    envir.fitness_cache = FitnessCache() # Shared by every run below.
+    if checkpoint is None or checkpoint.seeds is None:
+        seeds = [rng.randrange(2 ** 32) for i in range(0, GENE_POOL_SIZE)]
+        if checkpoint is not None:
+            checkpoint.seeds = seeds
+            checkpoint.rng_state = rng.getstate()
+            checkpoint.saveLog(log)
+    else:
+        seeds = checkpoint.seeds
+        rng.setstate(checkpoint.rng_state)
+    tasks = []
+    for i in range(0, GENE_POOL_SIZE):
+        tasks.append((envir.board, envir.item_stack, seeds[i], envir.profiling, envir.repairing))
+
+    # Expert runs that finished before the checkpoint was saved are already in the log,
+    # except for those that finished ahead of an earlier run, which wait in arrived.
+    finished = [] if checkpoint is None else checkpoint.experts
+    arrived  = {} if checkpoint is None else getattr(checkpoint, 'arrived', {}) # Older checkpoints have none.
+    if checkpoint is not None: checkpoint.arrived = arrived
+    for gene_pool, profiles in finished:
+        if envir.profiling: envir.expert_profiles.append(sumProfiles(profiles))
+        best = getBestGenomeIndex(gene_pool)
+        bestScore = gene_pool[best].score
+        expert_pool.append(copy.deepcopy(gene_pool[best]))
+
+    pool = None
+    pending = [(i, tasks[i]) for i in range(len(finished), GENE_POOL_SIZE) if i not in arrived]
+    if envir.workers != 1 and not monitor.followsExperts() and pending:
+        if checkpoint is not None: checkpoint.ga = None # Expert runs in other processes start over.
+        pool = multiprocessing.Pool(envir.workers or None, initRunWorker, (getRunSettings(),))
+        results = pool.imap_unordered(runIndexedExpert, pending)
+    try:
+        for i in range(len(finished), GENE_POOL_SIZE):
+            if i in arrived:
+                gene_pool, profiles = arrived[i]
+            elif pool is None:
+                # Update window title
+                monitor.setTitle("Wisdom of Crowds - Genetic Algorithm Run " + str(i + 1) + " of " + str(GENE_POOL_SIZE))
+                print("Beginning Genetic Algorithm run " + str(i + 1) + " of " + str(GENE_POOL_SIZE))
+                # Run the GA entirely
+                gene_pool, fitness_cache, profiles = runExpert(tasks[i], monitor, envir.fitness_cache, checkpoint, envir.workers)
+                if monitor.shouldStop(): return None # Need to exit if the run is stopping.
+            else:
+                monitor.setTitle("Wisdom of Crowds - Waiting for Genetic Algorithm Run " + str(i + 1) + " of " + str(GENE_POOL_SIZE))
+                while i not in arrived:
+                    monitor.setStatus("Running " + str(GENE_POOL_SIZE - i - len(arrived)) + " Genetic Algorithm runs.")
+                    result = waitForResult(results, monitor)
+                    if monitor.shouldStop(): return None # Need to exit if the run is stopping.
+                    index, (gene_pool, fitness_cache, profiles) = result
+                    envir.fitness_cache.merge(fitness_cache)
+                    # Keep it until the runs before it are logged.
+                    arrived[index] = (gene_pool, profiles)
+                    if checkpoint is not None: checkpoint.save()
+                gene_pool, profiles = arrived[i]
+
+            # Write the results to disk
+            envir.gene_pool = gene_pool
+            writeEnvironmentToDisk(envir, log, "Genetic Pool " + str(i))
+            if envir.profiling:
+                envir.expert_profiles.append(sumProfiles(profiles))
+                writeProfilesToDisk(profiles, log, "Profile of Genetic Pool " + str(i))
+            arrived.pop(i, None)
+            if checkpoint is not None:
+                checkpoint.experts.append((gene_pool, profiles))
+                checkpoint.ga = None
+                checkpoint.saveLog(log)
+            # Save the best result in the expert pool.
+            best = getBestGenomeIndex(envir.gene_pool)
+            bestScore = envir.gene_pool[best].score
+            expert_pool.append(copy.deepcopy(envir.gene_pool[best]))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    # Now we need to find a way to combine them...
+    # How about doing a new GA with this as the new pool???
+    #
+    # Copy the expert pool into the environment
+    envir.gene_pool = expert_pool
+    if checkpoint is None or not checkpoint.combining:
+        # Save the current environment to disk for further evaluation
+        writeEnvironmentToDisk(envir, log, "Expert Pool - Prior to WoC Round")
+        if checkpoint is not None:
+            checkpoint.combining = True
+            checkpoint.saveLog(log)
+
+        monitor.expertsReady()
+
+    # Run the genetic algorithm using the expert pool as the gene pool.
+    monitor.setTitle("Wisdom of Crowds - Genetic Algorithm Run of Combined Experts")
+    print("Running WoC")
+    runGeneticAlgorithm(envir, GENE_POOL_SIZE, False, monitor, rng, checkpoint)
+    if monitor.shouldStop(): return None # Need to exit if the run is stopping.
+
+    # Save the current environment to disk for further evaluation
+    writeEnvironmentToDisk(envir, log, "Expert Pool - After WoC Round")
+    if envir.profiling:
+        writeProfilesToDisk(envir.profiles, log, "Profile of WoC Round")
+        print("WoC round: " + str(sumProfiles(envir.profiles)))
+    print("Fitness cache: " + str(envir.fitness_cache.hits) + " hits, " + str(envir.fitness_cache.misses) + " misses.")
+    if checkpoint is not None: checkpoint.remove() # The run is complete.
+    return bestScore
+
+# Runs one complete expert Genetic Algorithm and returns its gene pool, fitness cache
+# and the GameProfile of each generation (empty unless profiling).
+# task is (board, item_stack, seed, profiling, repairing); the seed starts the run's own random stream.
+# checkpoint, if given, is saved every few generations and carries on the run it holds.
+# workers is as for Environment.workers; experts in a pool's worker processes keep to one.
+def runExpert(task, monitor=None, fitness_cache=None, checkpoint=None, workers=1):
+    board, item_stack, seed, profiling, repairing = task
+    setBoardSize(len(board), len(board[0])) # In case the worker didn't start as a copy of this process.
+    envir = Environment(board, item_stack)
+    envir.workers = workers
+    envir.profiling = profiling
+    envir.repairing = repairing
+    if fitness_cache is not None:
+        envir.fitness_cache = fitness_cache
+    runGeneticAlgorithm(envir, GENE_POOL_SIZE, True, monitor, random.Random(seed), checkpoint)
+    envir.close()
+    return envir.gene_pool, envir.fitness_cache, envir.profiles
+
+# Runs runExpert() in a pool's worker process for a task paired with its index among
+# the expert runs, and returns the index with the result.
+def runIndexedExpert(indexed_task):
+    index, task = indexed_task
+    return index, runExpert(task)
+
+# Returns the settings of this module that a run's worker processes need, for initRunWorker().
+# Processes started with spawn or forkserver import this module afresh, with its defaults.
+# The migration settings travel in each island's Migration instead.
+def getRunSettings():
+    return (GENE_POOL_SIZE, GENERATION_LIMIT, REPAIR_MOVES, QUIET)
+
+# Applies getRunSettings() of the process that started this worker.
+def initRunWorker(settings):
+    global GENE_POOL_SIZE, GENERATION_LIMIT, REPAIR_MOVES, QUIET
+    GENE_POOL_SIZE, GENERATION_LIMIT, REPAIR_MOVES, QUIET = settings
+    if QUIET:
+        sys.stdout = open(os.devnull, 'w')
+
+# Waits for the next result from a pool's imap_unordered() while still letting the monitor pause or stop the run.
+def waitForResult(results, monitor):
+    while True:
+        if monitor.shouldStop(): return None
+        try:
+            return results.next(1)
+        except multiprocessing.TimeoutError:
+            pass
+
+# Evolves ISLAND_COUNT gene pools side by side, each in its own process (or thread, with
+# one worker). Every MIGRATION_INTERVAL generations each island sends copies of its
+# MIGRANT_COUNT best genomes to the next island in a ring, where they replace the worst.
+# The islands wait for each other's migrants, so a run is the same however it is spread
+# over processes. Sets envir.gene_pool to the genomes of every island, and returns the
+# gene pool of each island, or None if the run was stopped. Raises RuntimeError if an
+# island fails, which stops the others.
+def runIslands(envir, monitor=None, rng=random, islands=ISLAND_COUNT):
+    if monitor is None: monitor = Monitor()
+    if envir.workers == 1:
+        Worker, Queue, Event = threading.Thread, queue.Queue, threading.Event
+        settings = None # Threads share this module's settings.
+    else:
+        Worker, Queue, Event = multiprocessing.Process, multiprocessing.Queue, multiprocessing.Event
+        settings = getRunSettings()
+    stopping = Event()
+    inboxes  = [Queue() for i in range(islands)]
+    results  = Queue()
+    workers  = []
+    for i in range(islands):
+        migration = Migration(inboxes[i], inboxes[(i + 1) % islands], stopping, MIGRATION_INTERVAL, MIGRANT_COUNT)
+        task = (envir.board, envir.item_stack, rng.randrange(2 ** 32), envir.profiling, envir.repairing)
+        workers.append(Worker(target=runIsland, args=(i, task, migration, results, settings), daemon=True))
+
+    monitor.setTitle("Island Model - Genetic Algorithm Runs on " + str(islands) + " Islands")
+    monitor.setStatus("Running " + str(islands) + " islands.")
+    gene_pools = [None] * islands
+    profiles   = [None] * islands
+    try:
+        for worker in workers:
+            worker.start()
+        for i in range(islands):
+            while True:
+                if monitor.shouldStop():
+                    stopping.set()
+                    return None # Need to exit if the run is stopping.
+                try:
+                    island, gene_pool, island_profiles = results.get(True, 1)
+                    break
+                except queue.Empty:
+                    pass
+                dead = [j for j in range(islands) if gene_pools[j] is None and not workers[j].is_alive()]
+                if dead:
+                    try:
+                        island, gene_pool, island_profiles = results.get(True, 1) # Its result may still be on the way.
+                        break
+                    except queue.Empty:
+                        raise RuntimeError("Island " + str(dead[0]) + " stopped without a result.")
+            if gene_pool is None:
+                raise RuntimeError("Island " + str(island) + " failed:\n" + island_profiles)
+            gene_pools[island] = gene_pool
+            profiles[island] = island_profiles
+            print("Island " + str(island) + " finished.")
+    finally:
+        stopping.set()
+        for worker in workers:
+            worker.join(1)
+            if worker.is_alive() and hasattr(worker, 'terminate'):
+                worker.terminate()
+
+    envir.gene_pool = [genome for gene_pool in gene_pools for genome in gene_pool]
+    if envir.profiling:
+        envir.profiles = [sumProfiles(generation) for generation in zip(*profiles)]
+    best = getBestGenomeIndex(envir.gene_pool)
+    monitor.setBestScore(envir.gene_pool[best].score)
+    return gene_pools
+
+# Runs the Genetic Algorithm of island number index, trading genomes through migration,
+# and puts (index, gene_pool, profiles) in results. task is as for runExpert().
+# settings, getRunSettings() of the run when the island has a process of its own.
+# If the island fails, it stops the other islands, which would otherwise wait for its
+# migrants, and puts (index, None, the traceback) in results instead.
+def runIsland(index, task, migration, results, settings=None):
+    try:
+        if settings is not None: initRunWorker(settings)
+        board, item_stack, seed, profiling, repairing = task
+        setBoardSize(len(board), len(board[0])) # In case the worker didn't start as a copy of this process.
+        envir = Environment(board, item_stack)
+        envir.workers = 1 # Each island already has a process of its own.
+        envir.profiling = profiling
+        envir.repairing = repairing
+        envir.migration = migration
+        runGeneticAlgorithm(envir, GENE_POOL_SIZE, True, IslandMonitor(migration.stopping), random.Random(seed))
+        envir.close()
+    except Exception:
+        migration.stopping.set()
+        results.put((index, None, traceback.format_exc()))
+        return
+    results.put((index, envir.gene_pool, envir.profiles))
+
+# Stops an island's run when the island run it belongs to is stopped.
+class IslandMonitor(Monitor):
+    def __init__(self, stopping):
+        self.stopping = stopping
+
+    def shouldStop(self):
+        return self.stopping.is_set()
+
+# Trades genomes between an island and its neighbours. Migrants arrive in inbox and
+# are sent to the next island's inbox as (generation, [(moves, score, length)]).
+class Migration(object):
+    def __init__(self, inbox, outbox, stopping, interval=MIGRATION_INTERVAL, count=MIGRANT_COUNT):
+        self.inbox    = inbox
+        self.outbox   = outbox
+        self.stopping = stopping # Set when the island run is stopped; nobody is left to wait for.
+        self.interval = interval
+        self.count    = count
+
+    # Called by runGeneticAlgorithm() at the end of every generation. Every interval
+    # generations, sends this island's best genomes on and waits for the previous
+    # island's, which take the places of the worst genomes they beat. Returns the
+    # best score among the genomes that moved in, or 0.
+    def exchange(self, envir, generation):
+        if self.interval == 0 or generation % self.interval != 0:
+            return 0
+        gene_pool = envir.gene_pool
+        best = sorted(range(len(gene_pool)), key=lambda i: gene_pool[i].score, reverse=True)[:self.count]
+        # Copies, since mutate() changes moves in place.
+        self.outbox.put((generation, [(gene_pool[i].moves[:], gene_pool[i].score, gene_pool[i].length) for i in best]))
+
+        migrants = None
+        while migrants is None:
+            if self.stopping.is_set(): return 0
+            try:
+                sent, migrants = self.inbox.get(True, 1)
+            except queue.Empty:
+                pass
+
+        bestScore = 0
+        known = set(genome.moves.tobytes() for genome in gene_pool)
+        for moves, score, length in migrants:
+            worst = min(range(len(gene_pool)), key=lambda i: gene_pool[i].score)
+            if score <= gene_pool[worst].score or moves.tobytes() in known:
+                continue
+            migrant = Genome(moves)
+            migrant.score, migrant.length = score, length
+            gene_pool[worst] = migrant
+            known.add(moves.tobytes())
+            bestScore = max(bestScore, score)
+        return bestScore
+
+# If checkpoint holds a run in progress, the run carries on from there. Otherwise, with a
+# checkpoint, the run saves to it every CHECKPOINT_INTERVAL generations.
+def runGeneticAlgorithm(envir, pool_size, reset=False, monitor=None, rng=random, checkpoint=None):
+    # Initialize
+    if monitor is None: monitor = Monitor()
+    if checkpoint is not None and checkpoint.ga is not None:
+        # Carry on from the checkpoint.
+        generation, bestScore, gene_pool, profiles, state = checkpoint.ga
+        envir.gene_pool = list(gene_pool)
+        envir.profiles  = list(profiles)
+        rng.setstate(state)
+        print("Resuming at generation " + str(generation) + ".")
+        monitor.setGeneration(generation)
+        monitor.setBestScore(bestScore)
+    else:
+        bestScore = 0
+        generation = 0
+        monitor.setGeneration(0)
+        monitor.setBestScore(0)
+        if envir.profiling: envir.profiles.append(GameProfile())
+
+        if reset is True:
+            # Regenerate pool
+            envir.gene_pool = []
+            for i in range(0, pool_size):
+                moves = generateMoves(rng)
+                genome = Genome(moves)
+                envir.gene_pool.append(genome)
+
+        # Perform fitness function for each genome
+        if monitor.shouldStop(): return # Need to exit if the run is stopping.
+        monitor.setStatus("Simulating " + str(len(envir.gene_pool)) + " genomes.")
+        scoreGenomes(envir, envir.gene_pool, monitor)
+        if monitor.shouldStop(): return # Need to exit if the run is stopping.
+        for genome in envir.gene_pool:
+            print("Genome scored " + str(genome.score) + " in " + str(genome.length) + " moves.")
+            if genome.score > bestScore: bestScore = genome.score
+        monitor.setBestScore(bestScore)
+
+    # Run until generationLimit
+    while generation < GENERATION_LIMIT:
+        if monitor.shouldStop(): return # Need to exit if the run is stopping.
+        monitor.setGeneration(generation + 1)
+        generation += 1
+        if envir.profiling: envir.profiles.append(GameProfile())
+
+        # Pick two genomes with roulette wheel selection?
+        monitor.setStatus("Selecting parent genomes.")
+        parentA = getNewParentIndex(envir.gene_pool, rng)
+        parentB = getNewParentIndex(envir.gene_pool, rng, parentA)
+
+        # Crossover the selected genomes
+        monitor.setStatus("Crossing over.")
+        childA = crossover(envir.gene_pool, parentA, parentB, rng, envir.repairing)
+        childB = crossover(envir.gene_pool, parentB, parentA, rng, envir.repairing)
+        monitor.setStatus("Simulating offspring")
+        scoreGenomes(envir, [childA, childB], monitor)
+        if monitor.shouldStop(): return # Need to exit if the run is stopping.
+        monitor.setStatus("Inserting...")
+
+        # Find out which two are the worst (including new genomes)
+        worst = -1
+        i = 0
+        for genome in envir.gene_pool:
+            if DEBUG: print("Score of " + str(i) + ": " + str(genome.score))
+            if worst == -1:
+                worst = i
+            elif genome.score < envir.gene_pool[worst].score:
+                worst = i
+            i += 1
+        if DEBUG: print("Worst score (" + str(worst) + "): " + str(envir.gene_pool[worst].score))
+
+        if childA.score < envir.gene_pool[worst].score: # Skip child A...
+            print("Child A (" + str(childA.score) + ") is not worth introducing into the gene pool.")
+            if childB.score > envir.gene_pool[worst].score: # Make sure B isn't also awful
+                print("Replacing genome at " + str(worst) + " with score of " + str(envir.gene_pool[worst].score))
+                print("With child B with score of " + str(childB.score))
+                envir.gene_pool[worst] = childB
+                if childB.score > bestScore:
+                    bestScore = childB.score
+                    monitor.setBestScore(bestScore)
+                else:
+                    print("Child B (" + str(childB.score) + ") is not worth introducing into the gene pool.")
+        elif childB.score < envir.gene_pool[worst].score: # Skip child B...
+            print("Child B (" + str(childB.score) + ") is not worth introducing into the gene pool.")
+            print("Replacing genome at " + str(worst) + " with score of " + str(envir.gene_pool[worst].score))
+            print("With child A with score of " + str(childA.score))
+            envir.gene_pool[worst] = childA
+            if childA.score > bestScore:
+                bestScore = childA.score
+                monitor.setBestScore(bestScore)
+        else:
+            print("Replacing genome at " + str(worst) + " with score of " + str(envir.gene_pool[worst].score))
+            print("With child A with score of " + str(childA.score))
+            envir.gene_pool[worst] = childA
+            if childA.score > bestScore:
+                bestScore = childA.score
+                monitor.setBestScore(bestScore)
+            # Find the second-worst to replace it with B.
+            worst2 = -1
+            i = 0
+            for genome in envir.gene_pool:
+                if DEBUG: print("Score of " + str(i) + ": " + str(genome.score))
+                if i == worst:
+                    continue
+                if worst2 == -1:
+                    worst2 = i
+                elif genome.score < envir.gene_pool[worst2].score:
+                    worst2 = i
+                i += 1
+
+            if childB.score > envir.gene_pool[worst2].score: # Make sure B isn't even worse.
+                print("Replacing genome at " + str(worst2) + " with score of " + str(envir.gene_pool[worst2].score))
+                print("With child B with score of " + str(childB.score))
+                envir.gene_pool[worst2] = childB
+                if childB.score > bestScore:
+                    bestScore = childB.score
+                    monitor.setBestScore(bestScore)
+
+        if DEBUG: print("Worst scoring one was " + str(worst) + " with score " + str(envir.gene_pool[worst].score))
+
+        # If it is time, then mutate, and rescore the mutated genome.
+        if generation%MUTATION_RATE == 0:
+            mutant = envir.gene_pool[mutate(envir.gene_pool, rng, envir.repairing)]
+            scoreGenomes(envir, [mutant], monitor)
+            if mutant.score > bestScore:
+                bestScore = mutant.score
+                monitor.setBestScore(bestScore)
+
+        if envir.migration is not None:
+            migrantScore = envir.migration.exchange(envir, generation)
+            if migrantScore > bestScore:
+                bestScore = migrantScore
+                monitor.setBestScore(bestScore)
+
+        if checkpoint is not None:
+            checkpoint.saveGeneration(envir, generation, bestScore, rng)
+    #
+
+    return()
+
+# Sets the score and length of each genome in genomes. Watched games are played one
+# at a time by the monitor. Otherwise games already in the fitness cache are not played
+# again, and the rest are scored together on the environment's pool of worker processes,
+# each resuming from its parent's snapshots where it can. When profiling, the timings of
+# the games played are added to the profile of the current generation, and each genome
+# keeps the profile of its own game. When repairing,
+# this is where crossed over and mutated genomes have their moves repaired, and the
+# fitness cache keeps the repaired moves with the result of the moves they came from.
+def scoreGenomes(envir, genomes, monitor):
+    profile = envir.profiles[-1] if envir.profiling and envir.profiles else None
+    if monitor.watchGames():
+        for genome in genomes:
+            if monitor.shouldStop(): return # Need to exit if the run is stopping.
+            genome.parent = None
+            genome.profile = None if profile is None else GameProfile()
+            genome.score, genome.length = monitor.playGame(genome.moves, envir.board, envir.item_stack, genome.profile,
+                                                           envir.repairing)
+            if profile is not None: profile.add(genome.profile)
+        return
+
+    playing = []
+    tasks   = []
+    keys    = {}
+    for genome in genomes:
+        parent = genome.parent
+        genome.parent = None
+        key    = envir.getGameKey(genome.moves)
+        result = envir.fitness_cache.get(key)
+        if parent is not None and (result is not None or key in keys):
+            # This game is not played, so only the snapshots from before the first changed
+            # move still hold. A mutant is its own parent, and its later ones are stale.
+            envir.snapshots.put(genome, envir.snapshots.before(parent, genome.firstChange))
+        if result is None and key in keys:
+            # Identical to a genome already waiting to be played in this batch.
+            keys[key].append(genome)
+            continue
+        if result is not None:
+            setGameResult(genome, result)
+            genome.profile = None # Its game was not played.
+            continue
+        keys[key] = [genome]
+        if parent is not None and parent.length is not None and parent.length <= genome.firstChange:
+            # The parent's game ended before the first changed move, so this game is the same.
+            # The moves after it are never played, so they need no repair either.
+            envir.snapshots.put(genome, envir.snapshots.before(parent, genome.firstChange))
+            genome.score, genome.length = parent.score, parent.length
+            envir.fitness_cache.put(key, (genome.score, genome.length))
+            continue
+
+        prefix = []
+        start  = None
+        if parent is not None:
+            prefix = envir.snapshots.before(parent, genome.firstChange)
+            if prefix: start = prefix.pop()
+        playing.append((key, prefix))
+        tasks.append((genome.moves, start))
+
+    if tasks == []:
+        return
+    if envir.fitness_pool is None:
+        envir.fitness_pool = FitnessPool(envir.board, envir.item_stack, envir.workers or None, envir.profiling,
+                                         envir.repairing)
+    results = envir.fitness_pool.resume(tasks)
+    for (key, prefix), (score, length, snapshots, gameProfile, moves) in zip(playing, results):
+        if profile is not None and gameProfile is not None:
+            profile.add(gameProfile)
+        result = (score, length) if moves is None else (score, length, moves)
+        envir.fitness_cache.put(key, result)
+        envir.snapshots.put(keys[key][0], prefix + snapshots)
+        for genome in keys[key]:
+            setGameResult(genome, result)
+            genome.profile = gameProfile
+        if moves is not None:
+            # Repaired moves play the same game again, so they share the result.
+            repairedKey = envir.getGameKey(keys[key][0].moves)
+            if repairedKey != key: envir.fitness_cache.put(repairedKey, result)
+
+# Sets a genome's score and length from a fitness cache result, and its moves too if
+# they were repaired. The moves are copied, since mutate() changes them in place.
+def setGameResult(genome, result):
+    genome.score, genome.length = result[0], result[1]
+    if len(result) > 2 and genome.moves.tobytes() != result[2]:
+        genome.moves = array(genome.moves.typecode, result[2])
+
+# The board size is the engine's, set with setBoardSize(); it is read from the engine
+# module each time, since a name imported from it would keep the size it had then.
+
+# Creates and returns a matrix of veggies for the initial game board, a list of
+# BOARD_WIDTH columns of BOARD_HEIGHT veggies each.
+def generateInitialLayout(rng=random):
+    print("Generating random game board...")
+    width, height = veggieengine.BOARD_WIDTH, veggieengine.BOARD_HEIGHT
+    initialLayout = [[0 for y in range(height)] for x in range(width)]
+
+    for x in range(width):
+        for y in range(height):
+            initialLayout[x][y] = rng.randint(0, NUM_VEGGIES - 1)
+
+    return initialLayout
+
+# Creates and returns a list of veggies that will be used to fill in empty spaces.
+# Every move on a larger board clears and refills more spaces, so there are
+# MAX_GAME_LENGTH veggies for every 64 spaces of the board, and at least that many.
+def generateReplacementList(rng=random):
+    print("Generating list of replacement veggies...")
+    count = MAX_GAME_LENGTH * max(1, veggieengine.BOARD_WIDTH * veggieengine.BOARD_HEIGHT // 64)
+    veggies = [0 for x in range(count)]
+
+    for i in range(0, count):
+        veggies[i] = rng.randint(1, NUM_VEGGIES - 1)
+
+    return veggies
+
+
+# Creates and returns an array of size MAX_GAME_LENGTH that contains random AI moves
+# over the whole board. When the environment repairs moves, each one that would make
+# no match is aimed at the nearest matching swap the first time the genome is scored.
+def generateMoves(rng=random):
+    if DEBUG: print("Generating AI moves...")
+
+    moves = newMoves(MAX_GAME_LENGTH)
+    width, height = veggieengine.BOARD_WIDTH, veggieengine.BOARD_HEIGHT
+
+    for i in range(0, MAX_GAME_LENGTH):
+        x = rng.randint(0, width - 1)
+        y = rng.randint(0, height - 1)
+        moves[i] = encodeMove(x, y, randMove(x, y, rng))
+
+    if DEBUG: print(moves)
+    return moves
+
+# Randomly selects a direction for the AI's move.  By evaluating the position, it always returns a valid move.
+def randMove(x, y, rng=random):
+    bag = list()
+    lastColumn, lastRow = veggieengine.BOARD_WIDTH - 1, veggieengine.BOARD_HEIGHT - 1
+
+    if x == 0:
+        if y == 0:
+            # Down or Right only
+            bag = list([DOWN, RIGHT])
+        elif y == lastRow:
+            # Up or Right only
+            bag = list([UP, RIGHT])
+        else:
+            # Up, Down, or Right
+            bag = list([UP, DOWN, RIGHT])
+    elif x == lastColumn:
+        if y == 0:
+            # Down or Left only
+            bag = list([DOWN, LEFT])
+        elif y == lastRow:
+            # Up or Left only
+            bag = list([UP, LEFT])
+        else:
+            # Up, Down, or Left
+            bag = list([UP, DOWN, LEFT])
+    elif y == 0:
+        # Down, Left, or Right
+        bag = list([DOWN, LEFT, RIGHT])
+    elif y == lastRow:
+        # Up, Left, or Right
+        bag = list([UP, LEFT, RIGHT])
+    else:
+        # Anything
+        bag = list([UP, DOWN, LEFT, RIGHT])
+
+    return rng.choice(bag)
+
+def getBestGenomeIndex(gene_pool):
+    bestScore = 0
+    bestIndex = -1
+    i = 0
+    for genome in gene_pool:
+        if genome.score > bestScore:
+            bestScore = genome.score
+            bestIndex = i
+        i += 1
+
+    if bestIndex == -1:
+        print("ERROR in getBestGenome()")
+
+    return bestIndex
+
+# Picks the index of a genome with a chance in proportion to its score, never picking
+# the genome at exclude. If none of the others has scored, any of them may be picked.
+def getNewParentIndex(gene_pool, rng=random, exclude=None):
+    candidates = [i for i in range(len(gene_pool)) if i != exclude]
+    sumScore = 0
+    for i in candidates:
+        sumScore += gene_pool[i].score
+    if sumScore == 0:
+        return rng.choice(candidates)
+
+    r = rng.randint(0, sumScore - 1)
+
+    sumScore = 0
+    for i in candidates:
+        sumScore += gene_pool[i].score
+        if r < sumScore:
+            return i
+
+# With repairing, the crosspoint falls within the moves both parents' games played.
+# Repaired games end after a few hundred moves, so a crosspoint past that would give
+# a child that plays the same game as parent A.
+def crossover(gene_pool, a, b, rng=random, repairing=False):
+    # Note that a and b are indices
+    genomeA = gene_pool[a]
+    genomeB = gene_pool[b]
+
+    crosspoint = rng.randint(0, getPlayedLength([genomeA, genomeB], repairing) - 1)
+
+    # Copy from A up to the crosspoint, then from B.
+    child = Genome(genomeA.moves[:crosspoint] + genomeB.moves[crosspoint:])
+    child.parent      = genomeA
+    child.firstChange = crosspoint
+    return child
+
+# Swap two random moves on a random genome. Returns the index of the mutated genome.
+# With repairing, both moves are among those the genome's game played.
+def mutate(gene_pool, rng=random, repairing=False):
+    i = rng.randint(0, GENE_POOL_SIZE - 1)
+    length = getPlayedLength([gene_pool[i]], repairing)
+    j = rng.randint(0, length - 1)
+    k = rng.randint(0, length - 1)
+
+    moves = gene_pool[i].moves
+    moves[j], moves[k] = moves[k], moves[j]
+
+    # The genome's own snapshots from before the first swapped move are still good.
+    gene_pool[i].parent      = gene_pool[i]
+    gene_pool[i].firstChange = min(j, k)
+    return i
+
+# Returns the number of moves that crossover() and mutate() choose among: the fewest
+# moves any of genomes played, when repairing, and otherwise every move.
+def getPlayedLength(genomes, repairing):
+    if not repairing or any(genome.length is None for genome in genomes):
+        return MAX_GAME_LENGTH
+    return max(1, min(genome.length for genome in genomes))
+
+''' Checkpoints '''
+
+# Everything a WoC run needs to carry on where it left off if its process dies. It is
+# saved with save(), which replaces the file at path in one step, so that a crash while
+# saving leaves the last checkpoint whole. Fitness caches and snapshots aren't saved;
+# they only make the run faster.
+class Checkpoint(object):
+    def __init__(self, path, board, item_stack, log_path=None, interval=CHECKPOINT_INTERVAL):
+        self.path        = path
+        self.interval    = interval   # Generations between saves of a GA run. 0 --> Only between runs.
+        self.board       = board
+        self.item_stack  = item_stack
+        self.log_path    = log_path   # The run log; records written after the last save are dropped on resume.
+        self.pool_size   = GENE_POOL_SIZE   # Settings the run was started with.
+        self.generation_limit = GENERATION_LIMIT
+        self.repair_moves = REPAIR_MOVES
+        self.log_records = 0          # Records in the run log when this was saved.
+        self.seeds       = None       # Seeds of the expert runs.
+        self.rng_state   = None       # State of the WoC run's random stream once the seeds were drawn.
+        self.experts     = []         # (gene_pool, profiles) of each expert run that has finished, in order.
+        self.arrived     = {}         # index: (gene_pool, profiles) of expert runs that finished ahead of those before them.
+        self.combining   = False      # True once the WoC round of combined experts has begun.
+        self.ga          = None       # (generation, bestScore, gene_pool, profiles, rng state) of the GA run in progress.
+
+    def save(self):
+        temp = self.path + ".tmp"
+        with open(temp, 'wb') as file:
+            pickle.dump(self, file, pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.path)
+
+    # Waits for everything sent to log to be written, then saves.
+    def saveLog(self, log):
+        log.flush()
+        self.log_records = log.records
+        self.save()
+
+    # Called by runGeneticAlgorithm() at the end of every generation.
+    def saveGeneration(self, envir, generation, bestScore, rng):
+        if self.interval and generation % self.interval == 0:
+            self.ga = (generation, bestScore, list(envir.gene_pool), list(envir.profiles), rng.getstate())
+            self.save()
+
+    # Sets GENE_POOL_SIZE, GENERATION_LIMIT, REPAIR_MOVES and the board size back to what
+    # they were when the run started. Checkpoints from before moves were repaired never
+    # repair them.
+    def applySettings(self):
+        global GENE_POOL_SIZE, GENERATION_LIMIT, REPAIR_MOVES
+        GENE_POOL_SIZE   = self.pool_size
+        GENERATION_LIMIT = self.generation_limit
+        REPAIR_MOVES     = getattr(self, 'repair_moves', False)
+        setBoardSize(len(self.board), len(self.board[0]))
+
+    # Deletes the saved checkpoint once its run is complete.
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def loadCheckpoint(path):
+    with open(path, 'rb') as file:
+        checkpoint = pickle.load(file)
+    checkpoint.path = path
+    return checkpoint
+
+''' Logging '''
+
+# log is a RunLogWriter (see veggielog.py); the board and item stack are in its header.
+# When profiling, the gene pool is followed by the profile of each genome's game.
+def writeEnvironmentToDisk(environ, log, section):
+    log.writeGenePool(section, environ.gene_pool)
+    if environ.profiling:
+        writeProfilesToDisk(getGenomeProfiles(environ.gene_pool), log, "Genome Profiles of " + section)
+
+# Returns the GameProfile of each genome in gene_pool. Genomes whose games were never
+# played, such as those scored from the fitness cache, get an empty one.
+def getGenomeProfiles(gene_pool):
+    profiles = []
+    for genome in gene_pool:
+        profile = getattr(genome, 'profile', None) # Genomes from older checkpoints have none.
+        profiles.append(GameProfile() if profile is None else profile)
+    return profiles
+
+# Returns one GameProfile with the totals of every profile in profiles.
+def sumProfiles(profiles):
+    total = GameProfile()
+    for profile in profiles:
+        total.add(profile)
+    return total
+
+def writeProfilesToDisk(profiles, log, section):
+    log.writeProfiles(section, profiles)
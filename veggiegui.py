@@ -0,0 +1,860 @@
+# Veggie Saga             #
+# Game window             #
+
+# Requires pygame.        #
+
+""" The window that shows a Wisdom of Crowds run and lets it be paused and
+    watched. Start it with "python veggiesaga.py"; nothing is created until
+    main() is called.
+
+    Note that the game looks for PNG images for each veggie using the name format
+    "veggie#.png" (# from 0 to NUM_VEGGIES - 1). """
+
+import random, time, pygame, collections
+from pygame.locals import *
+import tkinter as tk
+from tkinter import *
+from tkinter import messagebox
+import os, sys, multiprocessing
+from threading import Thread, Condition, Lock
+from veggieengine import *
+from veggiega import *
+from veggielog import openRunLog
+
+''' Constants '''
+
+FPS              = 0     # Screen refresh rate (in Frames Per Second). 0 --> No limit.
+MOVE_RATE        = 75    # Animation speed (1 to 100).  100 --> Skip animation.
+IMAGE_SIZE       = 64    # Tile size (px). Boards too big for the window get smaller tiles; see setBoardLayout().
+TEXT_CACHE_SIZE  = 128   # The number of rendered text surfaces kept for reuse.
+RENDER_FPS       = 60    # Frames per second drawn by the renderer thread.
+RENDER_QUEUE_SIZE = 512  # Game events waiting to be drawn. Past half full, the renderer skips ahead.
+PROGRESS_RATE    = 10    # Times per second the window shows the progress of the AI thread.
+
+# Window sizing constants
+WINDOW_WIDTH  = 800 # Width of game window (px).
+WINDOW_HEIGHT = 600 # Height of game window (px).
+X_MARGIN      = int((WINDOW_WIDTH - IMAGE_SIZE * BOARD_WIDTH) / 2)   # Margin size on the x-axis. Set by setBoardLayout().
+Y_MARGIN      = int((WINDOW_HEIGHT - IMAGE_SIZE * BOARD_HEIGHT) / 2) # Margin size on the y-axis. Set by setBoardLayout().
+
+# Display color constants
+GRID_COLOR         = (  0,   0, 255) # Blue; Game board color.
+SCORE_COLOR        = ( 85,  65,   0) # Pop-up score color.
+GAME_OVER_COLOR    = (255,   0,   0) # Red; Color of the "Game over" text.
+HIGHLIGHT_COLOR    = (255, 100, 100) # Reddish; Selected board space border color.
+GAME_OVER_BG_COLOR = (  0,   0,   0) # Black; Background color of the "Game over" text.
+
+SHUTDOWN_TIMEOUT = 5     # Seconds to wait for the AI and render threads to finish when the window is closed.
+
+thread = None
+renderThread = None
+controller = RunController() # Paused until the Start/Stop button is clicked.
+showMoves = False
+
+''' tkinter stuff '''
+
+def startButton(event):
+    controller.toggle()
+    return
+
+def showButton(event):
+    global showMoves
+    if not showMoves: showMoves = True
+    elif showMoves: showMoves = False
+    return
+
+def killWindow():
+    if messagebox.askokcancel("Quit", "Do you really want to quit?"):
+        print("Shutting down.")
+        controller.stop()
+        if thread is not None:
+            # The AI thread stops at its next move or generation.
+            thread.join(SHUTDOWN_TIMEOUT)
+            if thread.is_alive():
+                print("AI thread did not stop; leaving it behind.")
+        if renderThread is not None:
+            # The render thread stops after its current frame, and must not draw once pygame has quit.
+            renderThread.join(SHUTDOWN_TIMEOUT)
+            if renderThread.is_alive():
+                print("Render thread did not stop; leaving it behind.")
+        print("exiting pygame")
+        pygame.quit()
+        print("destroying root")
+        root.destroy()
+        print("quitting root")
+        root.quit()
+        print("quit()")
+        quit()
+        print("SystemExit")
+        raise SystemExit
+
+root = None # The Tk window, once createWindow() has made it.
+
+# Creates the Tk window and its controls, and points SDL at the frame pygame draws in.
+def createWindow():
+    global root, embed, genLabel, scoreLabel, statusLabel
+    root = tk.Tk()
+    root.protocol("WM_DELETE_WINDOW", killWindow)
+    embed = tk.Frame(root, width = WINDOW_WIDTH, height = WINDOW_HEIGHT)
+    embed.pack()
+    start = tk.Button(root, text='Start/Stop')
+    start.bind('<Button-1>', startButton)
+    start.pack(side=LEFT)
+    stop = tk.Button(root, text='Show/Hide Animations')
+    stop.bind('<Button-1>', showButton)
+    stop.pack(side=LEFT)
+
+    genLabel = StringVar()
+    Label(root, textvariable=genLabel).pack()
+    scoreLabel = StringVar()
+    Label(root, textvariable=scoreLabel).pack()
+    statusLabel = StringVar()
+    Label(root, textvariable=statusLabel).pack()
+    root.after(1000 // PROGRESS_RATE, showProgress)
+
+    #embed.grid(columnspan = 600, rowspan = 500) # Adds grid
+    #embed.pack(side = TOP) # packs window to the left
+    #buttonwin = tk.Frame(root, width = 75, height = 500)
+    #buttonwin.pack(side = RIGHT)
+    os.environ['SDL_WINDOWID'] = str(embed.winfo_id())
+    if sys.platform == 'win32':
+        os.environ['SDL_VIDEODRIVER'] = 'windib'
+
+
+''' Main function '''
+
+# resume, the path of a checkpoint to carry on the run of; None starts a new run.
+# interval, the generations between checkpoints of a new run's GA runs.
+# size, the (width, height) of a new run's board; None keeps the engine's size.
+def main(resume=None, interval=CHECKPOINT_INTERVAL, size=None):
+    global gameClock, gameWindow, IMAGES, mainFont, smallFont, boardRects, bgImage, draggingPosition, draggingVeggie
+    global thread, renderThread
+
+    # Initial set up.
+    # Worker processes are started afresh rather than forked from this one, which would
+    # copy SDL's signal handlers and any locks the window's threads hold at the time.
+    multiprocessing.set_start_method('spawn', force=True)
+    createWindow()
+    pygame.init()
+    gameClock        = pygame.time.Clock()
+    gameWindow       = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    pygame.display.set_caption('Veggie Saga')
+    mainFont         = pygame.font.Font(None, 72)
+    smallFont        = pygame.font.Font(None, 36) # Used for Game Over screen.
+    bgImage          = pygame.image.load("background.jpg").convert()
+    draggingPosition = None
+    draggingVeggie   = None
+
+    if resume is None:
+        if size is not None: setBoardSize(*size)
+        board = generateInitialLayout()
+        fills = generateReplacementList()
+        name  = time.strftime("%Y%m%d-%H%M%S")
+        checkpoint = Checkpoint(name + ".ckpt", board, fills, name + ".vlog", interval)
+    else:
+        checkpoint = loadCheckpoint(resume)
+        checkpoint.applySettings()
+        board = checkpoint.board
+        fills = checkpoint.item_stack
+    envir = Environment(board, fills)
+    setBoardLayout(len(board), len(board[0]))
+
+    # Load the images
+    IMAGES = []
+    for i in range(1, NUM_VEGGIES + 1):
+        img = pygame.image.load('veggie%s.png' % i)
+        if img.get_size() != (IMAGE_SIZE, IMAGE_SIZE):
+            img = pygame.transform.smoothscale(img, (IMAGE_SIZE, IMAGE_SIZE))
+        IMAGES.append(img.convert_alpha()) # Match the window's pixel format so blits need no conversion.
+
+    try:
+        #thread = Thread(target=runGeneticAlgorithm, args=(envir, GENE_POOL_SIZE, True))
+        thread = Thread(target=runWoC, args=(envir, checkpoint), daemon=True)
+        thread.start()
+        renderThread = Thread(target=renderGames, daemon=True)
+        renderThread.start()
+    except RuntimeError:
+        print("Failed to start thread.")
+
+    # Allow GUI to continue on main loop (waiting for events).
+    tk.mainloop()
+
+
+''' AI Code '''
+
+# Runs WoC, saving its progress to checkpoint, and carrying on from it if it was loaded from disk.
+def runWoC(envir, checkpoint):
+    global showMoves
+    # Initialize variables
+    filename  = checkpoint.log_path
+    file, log = openRunLog(checkpoint)
+
+    bestScore = runWisdomOfCrowds(envir, log, GUIMonitor(), random, checkpoint)
+    log.close()
+    file.close()
+    envir.close()
+    if bestScore is None: return # Need to exit thread if shutting down.
+    best2 = getBestGenomeIndex(envir.gene_pool)
+
+    # Alert the user that the algorithm has terminated.
+    msg = "Best of GA: " + str(bestScore) + "; Best of WoC: " + str(envir.gene_pool[best2].score) + "."
+    msg += "\nCheck the logfile (" + filename + ", read with veggielog.py) for details."
+    progressChannel.call(messagebox.showinfo, "The WoC Algorithm has completed.", msg)
+
+    if progressChannel.call(messagebox.askyesno, "Visualize final solution?", "Would you like to see the final solution animated?"):
+        bestGenome = envir.gene_pool[best2]
+        showMoves  = True
+        print("Final solution: index " + str(best2) + ", score: " + str(bestGenome.score))
+        print(str(bestGenome))
+        runGameAsAI(bestGenome.moves, envir.board, envir.item_stack, 40, None, True, envir.repairing)
+        renderQueue.waitUntilEmpty()
+        progressChannel.publish('status', "Done!")
+        controller.sleep(100)
+
+# Shows the progress of a GA run in the window and lets the buttons pause, stop and watch it.
+# Tk is only touched on its own thread, so the progress goes through progressChannel.
+class GUIMonitor(Monitor):
+    def setTitle(self, text):
+        progressChannel.publish('title', text)
+
+    def setGeneration(self, generation):
+        progressChannel.publish('generation', "Generation: " + str(generation))
+
+    def setBestScore(self, score):
+        progressChannel.publish('score', "Best score: " + str(score))
+
+    def setStatus(self, text):
+        progressChannel.publish('status', text)
+
+    def shouldStop(self):
+        return controller.check(showPaused)
+
+    def expertsReady(self):
+        progressChannel.call(messagebox.showinfo, "GA Pools ready", "Genetic Algorithm pools have completed.  Click OK to run WoC.")
+
+    def watchGames(self):
+        return showMoves
+
+    def followsExperts(self):
+        return True # Start/Stop and Show/Hide Animations reach no other process.
+
+    def playGame(self, moves, board, fills, profile=None, repair=False):
+        return runGameAsAI(moves, board, fills, 100, profile, False, repair)
+
+def showPaused():
+    progressChannel.publish('status', "Not running.")
+
+# Carries the progress of the AI thread to the Tk thread. The AI thread publishes
+# the latest text of each field, which replaces any the window has not shown yet,
+# so publishing costs a lock and a dict store however often it happens. Calls that
+# must run on the Tk thread, such as message boxes, wait there for their result.
+class ProgressChannel(object):
+    def __init__(self):
+        self.lock    = Lock()
+        self.pending = {}                  # field -> text not shown yet.
+        self.calls   = collections.deque() # (function, args, result), result a list the answer is appended to.
+        self.done    = Condition(self.lock)
+
+    def publish(self, field, text):
+        with self.lock:
+            self.pending[field] = text
+
+    # Runs function(*args) on the Tk thread and returns what it returns, or None if
+    # the run is stopped first.
+    def call(self, function, *args):
+        result = []
+        with self.lock:
+            self.calls.append((function, args, result))
+            while not result and not controller.stopping.is_set():
+                self.done.wait(0.1)
+        return result[0] if result else None
+
+    # Returns the fields published since the last take, and the calls waiting to run.
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            calls = list(self.calls)
+            self.calls.clear()
+        return pending, calls
+
+    # Hands value to the thread waiting in call() for result.
+    def answer(self, result, value):
+        with self.lock:
+            result.append(value)
+            self.done.notify_all()
+
+progressChannel = ProgressChannel()
+progressShown   = {} # field -> text shown in the window.
+
+# Runs on the Tk thread PROGRESS_RATE times a second, showing what progressChannel has
+# gathered since the last time. Labels are only set when their text changes.
+def showProgress():
+    root.after(1000 // PROGRESS_RATE, showProgress)
+    pending, calls = progressChannel.take()
+    labels = {'generation': genLabel, 'score': scoreLabel, 'status': statusLabel}
+    for field, text in pending.items():
+        if progressShown.get(field) == text: continue
+        progressShown[field] = text
+        if field == 'title': root.wm_title(text)
+        else: labels[field].set(text)
+    for function, args, result in calls:
+        value = None
+        try:
+            value = function(*args)
+        finally:
+            progressChannel.answer(result, value) # Never leave the AI thread waiting.
+
+# Requires moves, an array of MAX_GAME_LENGTH size that contains the AIs moves, in order,
+# each packed into one byte by encodeMove().
+# board, the layout of the board
+# item_stack, the stack of items that will fill in empty spaces.
+# profile, an optional GameProfile that the game's timings are added to.
+# wait, if True, the game waits for the renderer rather than letting it skip frames.
+# repair, if True, moves that would make no match are repaired as the game is played.
+def runGameAsAI(moves, board, fills, speed=MOVE_RATE, profile=None, wait=False, repair=False):
+    # Plays through a single game. When the game is over, this function returns.
+    # Unless the game is being watched, only the game logic is run.
+    if speed == 100 and not showMoves:
+        return simulate(moves, board, fills, profile=profile, repair=repair)
+
+    renderQueue.put((EVENT_NEW_GAME,), speed, wait)
+    return simulate(moves, board, fills, GameRenderer(speed, wait), profile=profile, repair=repair)
+
+class GameRenderer(object):
+    # Sends the events of a game played by simulate() to the renderer thread, so
+    # that drawing never holds up the game.
+    def __init__(self, speed=MOVE_RATE, wait=False):
+        self.speed = speed
+        self.wait  = wait
+
+    def __call__(self, event):
+        renderQueue.put(event, self.speed, self.wait)
+        if event[0] == EVENT_MOVE:
+            return controller.check(showPaused) # Need to stop the game if shutting down.
+        return False
+
+# Game events waiting to be drawn, each with the speed of its game. The AI thread puts
+# them in and the renderer thread takes them out. When the queue is full, the oldest
+# event is dropped, unless it starts a game: that resets the score and turn that the
+# events after it are drawn with. A game that waits is held up instead, before the
+# renderer would skip.
+class RenderQueue(object):
+    def __init__(self, size=RENDER_QUEUE_SIZE):
+        self.size      = size
+        self.events    = collections.deque()
+        self.dropped   = 0 # Events never drawn, either dropped or skipped.
+        self.condition = Condition()
+
+    def put(self, event, speed, wait=False):
+        with self.condition:
+            while wait and len(self.events) >= self.size // 2 and not controller.stopping.is_set(): # Never make the renderer skip.
+                self.condition.wait(0.1)
+            if len(self.events) >= self.size:
+                for i, item in enumerate(self.events):
+                    if item[0][0] != EVENT_NEW_GAME:
+                        del self.events[i]
+                        break
+                else:
+                    self.events.popleft() # Only new games are waiting; the next one replaces this one.
+                self.dropped += 1
+            self.events.append((event, speed))
+            self.condition.notify_all()
+
+    # Returns True if the renderer has fallen behind and should skip ahead.
+    def isBehind(self):
+        return len(self.events) > self.size // 2
+
+    # Returns the next (event, speed), or None if none arrives within timeout seconds.
+    # When the renderer is behind, every event before the newest settled board is skipped.
+    def take(self, timeout):
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+                if not self.events:
+                    return None
+            if self.isBehind():
+                # A settled board carries its own score and turn, so nothing before it is needed.
+                for i in range(len(self.events) - 1, 0, -1):
+                    if self.events[i][0][0] == EVENT_TURN:
+                        newGame = None
+                        for j in range(i):
+                            item = self.events.popleft()
+                            if item[0][0] == EVENT_NEW_GAME: newGame = item
+                            else: self.dropped += 1
+                        if newGame is not None: self.events.appendleft(newGame)
+                        break
+            item = self.events.popleft()
+            self.condition.notify_all()
+            return item
+
+    def waitUntilEmpty(self):
+        with self.condition:
+            while self.events and not controller.stopping.is_set():
+                self.condition.wait(0.1)
+
+EVENT_NEW_GAME = 'newGame' # (EVENT_NEW_GAME,) before the events of each game sent to the renderer.
+
+renderQueue = RenderQueue()
+
+# Runs on its own thread, drawing the events in renderQueue at up to RENDER_FPS frames per second.
+def renderGames():
+    clock  = pygame.time.Clock()
+    frames = iter(())
+    while not controller.stopping.is_set():
+        if renderQueue.isBehind():
+            frames = iter(()) # Cut the current animation short.
+        frame = next(frames, None)
+        if frame is None:
+            item = renderQueue.take(1.0)
+            if item is not None:
+                frames = getEventFrames(*item)
+            continue
+        board, sprites = frame
+        drawFrame(updateBoardLayer(board, score), sprites)
+        clock.tick(RENDER_FPS)
+
+# Yields the (board, sprites) frames that show event, and keeps score and turn up to date.
+def getEventFrames(event, speed):
+    global score, turn
+    kind = event[0]
+    if kind == EVENT_NEW_GAME:
+        score = 0
+        turn  = 0
+        invalidateBoardLayer() # The window may show anything; draw all of it on the first frame.
+    elif kind == EVENT_MOVE:
+        turn = event[1] + 1
+    elif kind == EVENT_SWAP or kind == EVENT_SWAP_BACK:
+        # Show the swap animation on the screen.
+        for frame in getAnimationFrames(event[1], event[2], [], speed):
+            yield frame
+    elif kind == EVENT_DROP:
+        score = event[4]
+        for frame in getAnimationFrames(event[1], event[2], getPointsText(event[3]), speed):
+            yield frame
+    elif kind == EVENT_TURN:
+        board, score, turn = event[1], event[2], event[3]
+        # Redraw the board.
+        if speed != 100:
+            yield board, []
+
+# Converts the board coordinates of points from the engine into screen coordinates.
+def getPointsText(points):
+    pointsText = []
+    for point in points:
+        pointsText.append({'points': point['points'],
+                           'x': point['x'] * IMAGE_SIZE + X_MARGIN,
+                           'y': point['y'] * IMAGE_SIZE + Y_MARGIN})
+    return pointsText
+
+''' Universal Game code '''
+
+def idleUntilExit(): # Wait for user to hit the Esc key, then exit.
+    while True:
+        event = pygame.event.wait()
+        if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+            pygame.quit()
+            root.quit()
+            sys.exit()
+
+
+''' Board layout '''
+
+# Sizes the engine and the drawing for a board width by height spaces. The tiles
+# shrink to fit the window, and the board is centred in it.
+def setBoardLayout(width, height):
+    global IMAGE_SIZE, X_MARGIN, Y_MARGIN, boardRects
+    setBoardSize(width, height)
+    IMAGE_SIZE = min(IMAGE_SIZE, WINDOW_WIDTH // width, WINDOW_HEIGHT // height)
+    X_MARGIN   = int((WINDOW_WIDTH - IMAGE_SIZE * width) / 2)
+    Y_MARGIN   = int((WINDOW_HEIGHT - IMAGE_SIZE * height) / 2)
+
+    # Create pygame.Rect objects for each board space to
+    # do board-coordinate-to-pixel-coordinate conversions.
+    boardRects = []
+    for x in range(width):
+        boardRects.append([])
+        for y in range(height):
+            r = pygame.Rect((X_MARGIN + (x * IMAGE_SIZE),
+                             Y_MARGIN + (y * IMAGE_SIZE),
+                             IMAGE_SIZE,
+                             IMAGE_SIZE))
+            boardRects[x].append(r)
+
+# Returns the ranges of the columns and rows of board spaces that rect overlaps.
+def getSpacesIn(rect):
+    columns = range(max(0, (rect.left - X_MARGIN) // IMAGE_SIZE),
+                    min(len(boardRects), (rect.right - 1 - X_MARGIN) // IMAGE_SIZE + 1))
+    rows    = range(max(0, (rect.top - Y_MARGIN) // IMAGE_SIZE),
+                    min(len(boardRects[0]), (rect.bottom - 1 - Y_MARGIN) // IMAGE_SIZE + 1))
+    return columns, rows
+
+
+''' Human player code '''
+
+def playGame():
+    # Plays through a single game. When the game is over, this function returns.
+    global draggingPosition, draggingVeggie
+    global score
+
+    # Initialize the board.
+    gameBoard               = []
+    for x in range(len(boardRects)):
+        gameBoard.append([EMPTY_SPACE] * len(boardRects[x]))
+
+    # initialize variables for the start of a new game
+    score                   = 0
+    turn                    = 0
+    gameIsOver              = False
+    draggingPosition        = None
+    lastMouseDownX          = None
+    lastMouseDownY          = None
+    firstSelectedVeggie     = None
+    clickContinueTextSurf   = None
+
+    # Populate and display the initial veggies.
+    fillBoardAndAnimate(gameBoard, [])
+
+    while turn < MAX_GAME_LENGTH: # Run game until there are no more possible moves or MAX_GAME_LENGTH moves made.
+        clickedSpace = None
+
+        ''' For human player input '''
+        for event in pygame.event.get(): # event handling loop
+            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+                pygame.quit()
+                sys.exit()
+            elif event.type == KEYUP and event.key == K_BACKSPACE:
+                return # start a new game
+
+            elif event.type == MOUSEBUTTONUP:
+                draggingPosition = None
+
+                if gameIsOver:
+                    return # after games ends, click to start a new game
+
+                if event.pos == (lastMouseDownX, lastMouseDownY):
+                    # This event is a mouse click, not the end of a mouse drag.
+                    clickedSpace = checkForVeggieClick(event.pos)
+                else:
+                    # this is the end of a mouse drag
+                    firstSelectedVeggie = checkForVeggieClick((lastMouseDownX, lastMouseDownY))
+                    clickedSpace = checkForVeggieClick(event.pos)
+                    if not firstSelectedVeggie or not clickedSpace:
+                        # if not part of a valid drag, deselect both
+                        firstSelectedVeggie = None
+                        clickedSpace = None
+            elif event.type == MOUSEBUTTONDOWN:
+                # this is the start of a mouse click or mouse drag
+                lastMouseDownX, lastMouseDownY = event.pos
+                draggingPosition = event.pos
+                draggingVeggie = checkForVeggieClick(event.pos)
+
+                # Uncomment to highlight the veggie square while dragging.
+                #firstSelectedVeggie = checkForVeggieClick((lastMouseDownX, lastMouseDownY))
+
+        if clickedSpace and not firstSelectedVeggie:
+            # This was the first veggie clicked on.
+            firstSelectedVeggie = clickedSpace
+        elif clickedSpace and firstSelectedVeggie:
+            # Two veggies have been clicked on and selected. Swap the veggies.
+            firstSwappingVeggie, secondSwappingVeggie = getSwappingVeggies(gameBoard, firstSelectedVeggie, clickedSpace)
+            if firstSwappingVeggie is None and secondSwappingVeggie is None:
+                # If both are None, then the veggies were not adjacent
+                firstSelectedVeggie = None # deselect the first veggie
+                continue
+
+            # Show the swap animation on the screen.
+            boardCopy = getBoardCopyMinusVeggies(gameBoard, (firstSwappingVeggie, secondSwappingVeggie))
+            animateMovingVeggies(boardCopy, [firstSwappingVeggie, secondSwappingVeggie], [])
+
+            # Swap the veggies in the board data structure.
+            gameBoard[firstSwappingVeggie['x']][firstSwappingVeggie['y']] = secondSwappingVeggie['imageNum']
+            gameBoard[secondSwappingVeggie['x']][secondSwappingVeggie['y']] = firstSwappingVeggie['imageNum']
+
+            # See if this is a matching move.
+            matchedVeggies = findMatchingVeggies(gameBoard)
+            if matchedVeggies == []:
+                # Was not a matching move; swap the veggies back
+                animateMovingVeggies(boardCopy, [firstSwappingVeggie, secondSwappingVeggie], [])
+                gameBoard[firstSwappingVeggie['x']][firstSwappingVeggie['y']] = firstSwappingVeggie['imageNum']
+                gameBoard[secondSwappingVeggie['x']][secondSwappingVeggie['y']] = secondSwappingVeggie['imageNum']
+            else:
+                # This was a matching move.
+                scoreAdd = 0
+                while matchedVeggies != []:
+                    # Remove matched veggies, then pull down the board.
+
+                    # points is a list of dicts that tells fillBoardAndAnimate()
+                    # where on the screen to display text to show how many
+                    # points the player got. points is a list because if
+                    # the playergets multiple matches, then multiple points text should appear.
+                    points = []
+                    for veggieSet in matchedVeggies:
+                        scoreAdd += (10 + (len(veggieSet) - 3) * 10)
+                        for veggie in veggieSet:
+                            gameBoard[veggie[0]][veggie[1]] = EMPTY_SPACE
+                        points.append({'points': scoreAdd,
+                                       'x': veggie[0],
+                                       'y': veggie[1]})
+                    score += scoreAdd
+
+                    # Drop the new veggies.
+                    fillBoardAndAnimate(gameBoard, points)
+
+                    # Check if there are any new matches.
+                    matchedVeggies = findMatchingVeggies(gameBoard)
+            firstSelectedVeggie = None
+
+            if not canMakeMove(gameBoard):
+                gameIsOver = True
+
+        # Draw the board.
+        gameWindow.blit(bgImage, [0, 0]) # Draw the background.
+        drawBoard(gameBoard)
+
+        if firstSelectedVeggie != None:
+            highlightSpace(firstSelectedVeggie['x'], firstSelectedVeggie['y'])
+
+        if gameIsOver:
+            if clickContinueTextSurf == None:
+                # Only render the text once. In future iterations, just
+                # use the Surface object already in clickContinueTextSurf
+                clickContinueTextSurf = smallFont.render('Final Score: %s (Press Esc to exit; Click to Continue)' % (score), 1, GAME_OVER_COLOR, GAME_OVER_BG_COLOR)
+                clickContinueTextRect = clickContinueTextSurf.get_rect()
+                clickContinueTextRect.center = int(WINDOW_WIDTH / 2), int(WINDOW_HEIGHT / 2)
+            gameWindow.blit(clickContinueTextSurf, clickContinueTextRect)
+        drawScore(score)
+        root.update()
+        pygame.display.update()
+        invalidateBoardLayer()
+        gameClock.tick(FPS)
+
+        return
+
+def getSwappingVeggies(board, firstXY, secondXY):
+    if DEBUG: print("getSwappingVeggies")
+    # If the veggies at the (X, Y) coordinates of the two veggies are adjacent,
+    # then their 'direction' keys are set to the appropriate direction
+    # value to be swapped with each other.
+    # Otherwise, (None, None) is returned.
+    firstVeggie = {'imageNum': board[firstXY['x']][firstXY['y']],
+                'x': firstXY['x'],
+                'y': firstXY['y']}
+    secondVeggie = {'imageNum': board[secondXY['x']][secondXY['y']],
+                 'x': secondXY['x'],
+                 'y': secondXY['y']}
+    highlightedVeggie = None
+    if firstVeggie['x'] == secondVeggie['x'] + 1 and firstVeggie['y'] == secondVeggie['y']:
+        firstVeggie['direction'] = LEFT
+        secondVeggie['direction'] = RIGHT
+    elif firstVeggie['x'] == secondVeggie['x'] - 1 and firstVeggie['y'] == secondVeggie['y']:
+        firstVeggie['direction'] = RIGHT
+        secondVeggie['direction'] = LEFT
+    elif firstVeggie['y'] == secondVeggie['y'] + 1 and firstVeggie['x'] == secondVeggie['x']:
+        firstVeggie['direction'] = UP
+        secondVeggie['direction'] = DOWN
+    elif firstVeggie['y'] == secondVeggie['y'] - 1 and firstVeggie['x'] == secondVeggie['x']:
+        firstVeggie['direction'] = DOWN
+        secondVeggie['direction'] = UP
+    else:
+        # These veggies are not adjacent and can't be swapped.
+        return None, None
+    return firstVeggie, secondVeggie
+
+def getMovingVeggieRect(veggie, progress):
+    # Returns where to draw a veggie sliding in the direction that its
+    # 'direction' key indicates. The progress parameter is a number from
+    # 0 (just starting) to 100 (slide complete).
+    movex = 0
+    movey = 0
+    progress *= 0.01
+
+    if veggie['direction'] == UP:
+        movey = -int(progress * IMAGE_SIZE)
+    elif veggie['direction'] == DOWN:
+        movey = int(progress * IMAGE_SIZE)
+    elif veggie['direction'] == RIGHT:
+        movex = int(progress * IMAGE_SIZE)
+    elif veggie['direction'] == LEFT:
+        movex = -int(progress * IMAGE_SIZE)
+
+    basex = veggie['x']
+    basey = veggie['y']
+    if basey == HIDDEN_ROW:
+        basey = -1
+
+    pixelx = X_MARGIN + (basex * IMAGE_SIZE)
+    pixely = Y_MARGIN + (basey * IMAGE_SIZE)
+    return pygame.Rect( (pixelx + movex, pixely + movey, IMAGE_SIZE, IMAGE_SIZE) )
+
+
+def highlightSpace(x, y):
+    pygame.draw.rect(gameWindow, HIGHLIGHT_COLOR, boardRects[x][y], 4)
+
+
+def animateMovingVeggies(board, veggies, pointsText, speed=MOVE_RATE):
+    #if DEBUG: print("animateMovingVeggies")
+    global score
+
+    for board, sprites in getAnimationFrames(board, veggies, pointsText, speed):
+        drawFrame(updateBoardLayer(board, score), sprites)
+    gameClock.tick(FPS)
+
+# Yields the (board, sprites) frames of veggies moving over board, with pointsText shown on top.
+def getAnimationFrames(board, veggies, pointsText, speed=MOVE_RATE):
+    # pointsText is a dictionary with keys 'x', 'y', and 'points'
+    progress = 0 # progress at 0 represents beginning, 100 means finished.
+    if showMoves is True: progress = 0
+    elif speed == 100: progress = 100
+    points = []
+    for pointText in pointsText:
+        pointsSurf = renderText(mainFont, "+" + str(pointText['points']) + "!", SCORE_COLOR)
+        pointsRect = pointsSurf.get_rect()
+        pointsRect.center = (pointText['x'], pointText['y'])
+        points.append((pointsSurf, pointsRect))
+    while progress < 100: # animation loop
+        sprites = []
+        for veggie in veggies: # Draw each veggie.
+            sprites.append((IMAGES[veggie['imageNum']], getMovingVeggieRect(veggie, progress)))
+        yield board, sprites + points
+        progress += speed # progress the animation a little bit more for the next frame
+
+
+def fillBoardAndAnimate(board, points, fills, speed=MOVE_RATE):
+    global fillIndex
+    if DEBUG: print("fillBoardAndAnimate")
+    fillIndex = fillBoard(board, points, fills, fillIndex, score, GameRenderer(speed))
+
+
+def checkForVeggieClick(pos):
+    # See if the mouse click was on the board
+    columns, rows = getSpacesIn(pygame.Rect(pos[0], pos[1], 1, 1))
+    if columns and rows:
+        return {'x': columns[0], 'y': rows[0]}
+    return None # Click was not on the board.
+
+
+def drawBoard(board):
+    for x in range(len(board)):
+        for y in range(len(board[x])):
+            pygame.draw.rect(gameWindow, GRID_COLOR, boardRects[x][y], 1)
+            veggieToDraw = board[x][y]
+            if not draggingPosition is None:
+                #print ("Dragging...")
+                if (x == draggingVeggie['x']) and (y == draggingVeggie['y']):
+                    # Drag the image with the mouse
+                    if veggieToDraw != EMPTY_SPACE:
+                        #gameWindow.blit(IMAGES[veggieToDraw], [pygame.mouse.get_pos[0], pygame.mouse.get_pos[1]])
+                        #print (pygame.mouse.get_pos())
+                        mouse_pos = pygame.mouse.get_pos()
+                        veg_item  = boardRects[x][y]
+                        gameWindow.blit(IMAGES[veggieToDraw], [mouse_pos[0] - IMAGE_SIZE // 2, mouse_pos[1] - IMAGE_SIZE // 2])
+                else:
+                    if veggieToDraw != EMPTY_SPACE:
+                        gameWindow.blit(IMAGES[veggieToDraw], boardRects[x][y])
+            else:
+                if veggieToDraw != EMPTY_SPACE:
+                    gameWindow.blit(IMAGES[veggieToDraw], boardRects[x][y])
+
+
+''' Dirty-rectangle drawing '''
+
+# Games played by the AI are drawn in two layers. boardLayer holds the background,
+# the grid, the veggies at rest and the score; only the spaces and text that change
+# are redrawn on it. Moving veggies and points are sprites, drawn on the window over
+# a copy of boardLayer. Each frame copies boardLayer back only under the last frame's
+# sprites and the changed parts of the layer, and only those rects are updated.
+boardLayer  = None # Surface the size of the window.
+gridCell    = None # The grid around one space. draw.rect() outlines the clipped rect instead, so it is blitted.
+layerBoard  = None # The board drawn on boardLayer; None --> Redraw all of it.
+layerScore  = None # (text, rect, surface) of the score drawn on boardLayer.
+spriteRects = []   # Rects of the window drawn over boardLayer in the last frame.
+
+def invalidateBoardLayer():
+    global layerBoard
+    layerBoard = None
+
+# Redraws whatever changed on boardLayer to show board and score, and returns the changed rects.
+def updateBoardLayer(board, score):
+    global boardLayer, gridCell, layerBoard, layerScore
+    dirty = []
+    if layerBoard is None:
+        if boardLayer is None:
+            boardLayer = bgImage.copy()
+            gridCell   = pygame.Surface((IMAGE_SIZE, IMAGE_SIZE), SRCALPHA)
+            pygame.draw.rect(gridCell, GRID_COLOR, gridCell.get_rect(), 1)
+        boardLayer.blit(bgImage, [0, 0])
+        layerBoard = [[None] * len(board[x]) for x in range(len(board))]
+        layerScore = None
+        dirty.append(boardLayer.get_rect())
+
+    for x in range(len(board)):
+        for y in range(len(board[x])):
+            if board[x][y] != layerBoard[x][y]:
+                layerBoard[x][y] = board[x][y]
+                redrawBoardLayer(boardRects[x][y])
+                dirty.append(boardRects[x][y])
+
+    text = "Score: " + str(score) + "   Turn: " + str(turn)
+    if layerScore is None or layerScore[0] != text:
+        scoreImg  = renderText(mainFont, text, SCORE_COLOR)
+        scoreRect = scoreImg.get_rect()
+        scoreRect.bottomleft = (10, WINDOW_HEIGHT - 6)
+        oldRect = scoreRect if layerScore is None else layerScore[1]
+        layerScore = (text, scoreRect, scoreImg)
+        redrawBoardLayer(scoreRect.union(oldRect))
+        dirty.append(scoreRect.union(oldRect))
+    return dirty
+
+# Redraws everything on boardLayer within rect, from the background up.
+def redrawBoardLayer(rect):
+    boardLayer.set_clip(rect)
+    boardLayer.blit(bgImage, rect, rect)
+    columns, rows = getSpacesIn(rect)
+    for x in columns:
+        for y in rows:
+            boardLayer.blit(gridCell, boardRects[x][y])
+            if layerBoard[x][y] is not None and layerBoard[x][y] != EMPTY_SPACE:
+                boardLayer.blit(IMAGES[layerBoard[x][y]], boardRects[x][y])
+    if layerScore is not None and layerScore[1].colliderect(rect):
+        boardLayer.blit(layerScore[2], layerScore[1])
+    boardLayer.set_clip(None)
+
+# Shows boardLayer with sprites, a list of (surface, rect), drawn over it. dirty is
+# the rects of boardLayer that changed since the last frame.
+def drawFrame(dirty, sprites):
+    global spriteRects
+    dirty = dirty + spriteRects
+    for rect in dirty:
+        gameWindow.blit(boardLayer, rect, rect)
+    spriteRects = []
+    for surface, rect in sprites:
+        spriteRects.append(gameWindow.blit(surface, rect))
+    pygame.display.update(dirty + spriteRects)
+
+
+# Rendered text surfaces by (font, text, color). Holds at most TEXT_CACHE_SIZE and
+# forgets the least recently used first.
+textCache = collections.OrderedDict()
+
+# Returns font.render(text, 1, color), rendering it only if it isn't in textCache.
+def renderText(font, text, color):
+    key = (font, text, color)
+    surface = textCache.get(key)
+    if surface is None:
+        surface = font.render(text, 1, color).convert_alpha()
+        textCache[key] = surface
+        while len(textCache) > TEXT_CACHE_SIZE:
+            textCache.popitem(False)
+    else:
+        textCache.move_to_end(key)
+    return surface
+
+
+def drawScore(score):
+    global turn
+    if turn is None: turn = 0
+    scoreImg = renderText(mainFont, "Score: " + str(score) + "   Turn: " + str(turn), SCORE_COLOR)
+    scoreRect = scoreImg.get_rect()
+    scoreRect.bottomleft = (10, WINDOW_HEIGHT - 6)
+    gameWindow.blit(scoreImg, scoreRect)
+
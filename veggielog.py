@@ -0,0 +1,292 @@
+# Veggie Saga             #
+# Run logs                #
+
+# Never touches pygame or tkinter. #
+
+""" The binary log of a Wisdom of Crowds run. A log is append-only: a short magic
+    string, then one record after another, each a kind byte and a payload length
+    followed by the payload. The first record holds the board and fill list, and
+    the rest hold gene pools and profiles. The moves of a gene pool are packed one
+    byte each, or two, little-endian, on boards over 8 spaces across (see
+    encodeMove()). A log cut short by a crash can still be read up to its last
+    whole record.
+
+    A RunLogWriter packs records on the GA thread and writes them out on its own
+    thread. readRunLog() streams records back one at a time, so logs too big to
+    fit in memory can still be gone through:
+
+        python veggielog.py 20240101-120000.vlog --moves """
+
+import argparse, os, queue, struct, sys, threading
+from array import array
+from veggieengine import *
+from veggiega import *
+
+''' Constants '''
+
+LOG_MAGIC        = b'VEGLOG\x00\x01' # Starts every log; the last byte is the format version.
+LOG_QUEUE_SIZE   = 64                # Records waiting to be written before the GA has to wait for the disk.
+
+RECORD_HEADER    = 0 # Board width and height, NUM_VEGGIES, the packed board and the fill list.
+RECORD_GENE_POOL = 1 # A section name and the score, length and packed moves of each genome.
+RECORD_PROFILES  = 2 # A section name and a GameProfile of each generation, or of each genome in a gene pool.
+
+RECORD_FORMAT    = struct.Struct('<BI')   # Kind, payload length.
+HEADER_FORMAT    = struct.Struct('<HHBI') # Board width, board height, NUM_VEGGIES, fill count.
+NAME_FORMAT      = struct.Struct('<H')    # Length of a UTF-8 section name.
+POOL_FORMAT      = struct.Struct('<IH')   # Genome count, moves per genome.
+GENOME_FORMAT    = struct.Struct('<ii')   # Score, length; -1 if the genome was never scored.
+PROFILE_FORMAT   = struct.Struct('<' + 'd' * len(PROFILE_PHASES) + 'Q' * len(PROFILE_PHASES) + 'QQQQQ')
+
+''' Writing '''
+
+# Appends records to a binary file opened for writing. The caller opens and closes
+# the file; close() this first, so that every record has been written. To carry on
+# a log, open it for appending and pass the number of records it already holds
+# after its header as records (see truncateRunLog()).
+class RunLogWriter(object):
+    def __init__(self, file, board, fills, records=None):
+        self.file    = file
+        self.error   = None # The first exception raised while writing, raised again on the GA thread.
+        self.queue   = queue.Queue(LOG_QUEUE_SIZE)
+        self.records = records or 0 # Records sent to the log after its header.
+        self.thread  = threading.Thread(target=self.writeRecords, daemon=True)
+        self.thread.start()
+        if records is None:
+            self.put(LOG_MAGIC)
+            self.put(packRecord(RECORD_HEADER, packHeader(board, fills)))
+
+    def writeGenePool(self, section, gene_pool):
+        self.putRecord(RECORD_GENE_POOL, packGenePool(section, gene_pool))
+
+    def writeProfiles(self, section, profiles):
+        self.putRecord(RECORD_PROFILES, packProfiles(section, profiles))
+
+    # Waits until every record sent so far is on disk.
+    def flush(self):
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    # Waits for every record to be written and stops the writing thread.
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.error is not None:
+            raise self.error
+
+    def putRecord(self, kind, payload):
+        self.records += 1
+        self.put(packRecord(kind, payload))
+
+    def put(self, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(data)
+
+    def writeRecords(self):
+        # Runs on the writing thread until close() queues None.
+        while True:
+            data = self.queue.get()
+            if data is None:
+                self.queue.task_done()
+                break
+            if self.error is None: # Otherwise keep draining so that the GA never blocks on a full queue.
+                try:
+                    self.file.write(data)
+                except Exception as error:
+                    self.error = error
+            self.queue.task_done()
+        try:
+            self.file.flush()
+        except Exception as error:
+            if self.error is None: self.error = error
+
+def packRecord(kind, payload):
+    return RECORD_FORMAT.pack(kind, len(payload)) + payload
+
+def packName(section):
+    name = section.encode('utf-8')
+    return NAME_FORMAT.pack(len(name)) + name
+
+def packHeader(board, fills):
+    return HEADER_FORMAT.pack(len(board), len(board[0]), NUM_VEGGIES, len(fills)) + packBoard(board) + bytes(fills)
+
+def packGenePool(section, gene_pool):
+    movesLength = len(gene_pool[0].moves) if gene_pool else 0
+    parts = [packName(section), POOL_FORMAT.pack(len(gene_pool), movesLength)]
+    for genome in gene_pool:
+        score  = -1 if genome.score is None else genome.score
+        length = -1 if genome.length is None else genome.length
+        parts.append(GENOME_FORMAT.pack(score, length))
+        parts.append(packMoves(genome.moves))
+    return b''.join(parts)
+
+# Returns the bytes of moves, little-endian.
+def packMoves(moves):
+    if moves.itemsize > 1 and sys.byteorder == 'big':
+        moves = array(moves.typecode, moves)
+        moves.byteswap()
+    return moves.tobytes()
+
+# Returns the moves packed by packMoves() in data, as an array of typecode.
+def unpackMoves(data, typecode):
+    moves = array(typecode, data)
+    if moves.itemsize > 1 and sys.byteorder == 'big':
+        moves.byteswap()
+    return moves
+
+def packProfiles(section, profiles):
+    parts = [packName(section), struct.pack('<I', len(profiles))]
+    for profile in profiles:
+        values  = [profile.times[phase] for phase in PROFILE_PHASES]
+        values += [profile.calls[phase] for phase in PROFILE_PHASES]
+        values += [profile.games, profile.failedSwaps, profile.cascades, profile.deepestCascade, profile.fillsUsed]
+        parts.append(PROFILE_FORMAT.pack(*values))
+    return b''.join(parts)
+
+''' Reading '''
+
+# Yields the records of the log at path one at a time, as tuples:
+#   (RECORD_HEADER, board, fills)
+#   (RECORD_GENE_POOL, section, gene_pool), a list of Genomes
+#   (RECORD_PROFILES, section, profiles), a list of GameProfiles
+# Stops quietly at a record cut short at the end of the file.
+def readRunLog(path):
+    with open(path, 'rb') as file:
+        if file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(path + " is not a Veggie Saga run log.")
+        typecode = 'B' # The size of the moves depends on the board, in the header.
+        while True:
+            head = file.read(RECORD_FORMAT.size)
+            if len(head) < RECORD_FORMAT.size:
+                return
+            kind, size = RECORD_FORMAT.unpack(head)
+            payload = file.read(size)
+            if len(payload) < size:
+                return
+            if kind == RECORD_HEADER:
+                board, fills = unpackHeader(payload)
+                typecode = getMoveTypecode(len(board), len(board[0]))
+                yield kind, board, fills
+            elif kind == RECORD_GENE_POOL:
+                yield (kind,) + unpackGenePool(payload, typecode)
+            elif kind == RECORD_PROFILES:
+                yield (kind,) + unpackProfiles(payload)
+            # Records of unknown kinds, from newer versions, are skipped.
+
+# Cuts the log at path down to its header and the records records after it, such as
+# those a checkpoint knows about, so that a resumed run can carry it on.
+def truncateRunLog(path, records):
+    with open(path, 'r+b') as file:
+        if file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(path + " is not a Veggie Saga run log.")
+        for i in range(records + 1): # The header too.
+            head = file.read(RECORD_FORMAT.size)
+            if len(head) < RECORD_FORMAT.size:
+                raise ValueError(path + " has fewer records than its checkpoint.")
+            kind, size = RECORD_FORMAT.unpack(head)
+            file.seek(size, os.SEEK_CUR)
+        file.truncate(file.tell())
+
+# Opens the run log of checkpoint's run, carrying it on if the run is being resumed.
+# Returns (file, log); close the log, then the file.
+def openRunLog(checkpoint):
+    if checkpoint.seeds is None:
+        file = open(checkpoint.log_path, 'wb')
+        return file, RunLogWriter(file, checkpoint.board, checkpoint.item_stack)
+    print("Resuming the run in " + checkpoint.path + ".")
+    truncateRunLog(checkpoint.log_path, checkpoint.log_records)
+    file = open(checkpoint.log_path, 'ab')
+    return file, RunLogWriter(file, checkpoint.board, checkpoint.item_stack, checkpoint.log_records)
+
+def unpackName(payload):
+    size, = NAME_FORMAT.unpack_from(payload)
+    end = NAME_FORMAT.size + size
+    return payload[NAME_FORMAT.size:end].decode('utf-8'), end
+
+def unpackHeader(payload):
+    width, height, numVeggies, fillCount = HEADER_FORMAT.unpack_from(payload)
+    offset = HEADER_FORMAT.size
+    packedBoard = payload[offset:offset + width * height]
+    board = [[veggie - 1 for veggie in packedBoard[x * height:(x + 1) * height]] for x in range(width)]
+    offset += width * height
+    fills = list(payload[offset:offset + fillCount])
+    return board, fills
+
+def unpackGenePool(payload, typecode='B'):
+    section, offset = unpackName(payload)
+    count, movesLength = POOL_FORMAT.unpack_from(payload, offset)
+    offset += POOL_FORMAT.size
+    movesSize = movesLength * array(typecode).itemsize
+    gene_pool = []
+    for i in range(count):
+        score, length = GENOME_FORMAT.unpack_from(payload, offset)
+        offset += GENOME_FORMAT.size
+        genome = Genome(unpackMoves(payload[offset:offset + movesSize], typecode))
+        offset += movesSize
+        genome.score  = None if score == -1 else score
+        genome.length = None if length == -1 else length
+        gene_pool.append(genome)
+    return section, gene_pool
+
+def unpackProfiles(payload):
+    section, offset = unpackName(payload)
+    count, = struct.unpack_from('<I', payload, offset)
+    offset += 4
+    phases = len(PROFILE_PHASES)
+    profiles = []
+    for i in range(count):
+        values = PROFILE_FORMAT.unpack_from(payload, offset)
+        offset += PROFILE_FORMAT.size
+        profile = GameProfile()
+        for j, phase in enumerate(PROFILE_PHASES):
+            profile.times[phase] = values[j]
+            profile.calls[phase] = values[phases + j]
+        profile.games, profile.failedSwaps, profile.cascades, profile.deepestCascade, profile.fillsUsed = values[2 * phases:]
+        profiles.append(profile)
+    return section, profiles
+
+''' Reader tool '''
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the contents of a Veggie Saga run log.")
+    parser.add_argument('log', help="run log to read")
+    parser.add_argument('--moves', action='store_true', help="print every genome's moves")
+    args = parser.parse_args()
+
+    for record in readRunLog(args.log):
+        kind = record[0]
+        if kind == RECORD_HEADER:
+            board, fills = record[1:]
+            setBoardSize(len(board), len(board[0])) # So that moves are decoded for this board.
+            print("BOARD: " + str(board))
+            print("VEG_STACK: " + str(len(fills)) + " veggies")
+        elif kind == RECORD_GENE_POOL:
+            section, gene_pool = record[1:]
+            print("\n" + section)
+            print("INDEX\tSCORE\tTURNS" + ("\tSEQUENCE" if args.moves else ""))
+            for i, genome in enumerate(gene_pool):
+                line = str(i) + "\t" + str(genome.score) + "\t" + str(genome.length)
+                if args.moves:
+                    line += "\t" + str([decodeMove(code) for code in genome.moves])
+                print(line)
+        elif kind == RECORD_PROFILES:
+            section, profiles = record[1:]
+            print("\n" + section)
+            print("INDEX\tPROFILE") # Generations, or genomes of the gene pool the section names.
+            for i, profile in enumerate(profiles):
+                print(str(i) + "\t" + str(profile))
+            print("TOTAL\t" + str(sumProfiles(profiles)))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except BrokenPipeError: # Piped into head or less.
+        sys.stderr.close()